@@ -7,9 +7,10 @@ from flask_jwt_extended import JWTManager
 from flask_swagger_ui import get_swaggerui_blueprint
 from flask_cors import CORS
 import os
+from .db_routing import RoutingSession
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 bcrypt = Bcrypt()
 mail = Mail()
@@ -22,6 +23,10 @@ def create_app():
     from .config import Config
     app.config.from_object(Config)
     
+    # Before anything touches app.logger, so Flask doesn't install its own stderr handler
+    from .structured_logging import configure_logging
+    configure_logging(app)
+    
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
@@ -29,12 +34,17 @@ def create_app():
     mail.init_app(app)
     jwt.init_app(app)
     
+    # Falls back to unbuffered touches on databases the buffer can't write to
+    from .touch_buffer import init_touch_buffer
+    init_touch_buffer(app)
+    
     # Initialize CORS
     CORS(app, resources={
         r"/api/*": {
             "origins": "*",
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"]
+            "allow_headers": ["Content-Type", "Authorization", "If-None-Match", "Last-Event-ID"],
+            "expose_headers": ["ETag", "Last-Modified"]
         }
     })
 
@@ -82,7 +92,32 @@ def create_app():
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(notes_bp, url_prefix='/api/notes')
 
-    with app.app_context():
-        db.create_all()
+    # Request, SQL, Gemini and archiving metrics, scraped from /metrics
+    from .metrics import init_metrics
+    init_metrics(app)
+
+    # Register CLI commands
+    from .archiver import run_archiver_command
+    from .tasks import archive_expired_command, reconcile_stats_command, prune_events_command, init_db_command
+    from .enrichment import run_enrichment_worker_command
+    from .outbox import run_email_worker_command
+    app.cli.add_command(run_archiver_command)
+    app.cli.add_command(archive_expired_command)
+    app.cli.add_command(reconcile_stats_command)
+    app.cli.add_command(prune_events_command)
+    app.cli.add_command(run_enrichment_worker_command)
+    app.cli.add_command(run_email_worker_command)
+    app.cli.add_command(init_db_command)
+
+    # Schema creation is an explicit step ('flask init-db' / Procfile release), not part of every boot
+
+    # With gunicorn --preload the app is built once in the master and forked; give each
+    # worker fresh pools instead of sharing any connection the master might have opened
+    def dispose_engines_after_fork():
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+    os.register_at_fork(after_in_child=dispose_engines_after_fork)
 
     return app
\ No newline at end of file
@@ -0,0 +1,235 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import has_app_context
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from . import db
+from .config import Config
+from .models import AICacheEntry
+
+# Bump whenever the summary/questions prompt changes so old answers stop matching
+SUMMARY_PROMPT_VERSION = "summary-v1"
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with a per-entry TTL"""
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class SummaryCache:
+    """Two-tier cache for generated summaries and questions.
+
+    Entries are addressed by a hash of (prompt version, title, content), so any
+    change to the note text misses naturally. The first tier is a per-process LRU;
+    the second is the ai_cache_entry table, shared by every worker.
+    """
+
+    def __init__(self, max_entries, ttl_seconds, db_max_entries, db_ttl_seconds):
+        self.memory = LRUCache(max_entries, ttl_seconds)
+        self.db_max_entries = db_max_entries
+        self.db_ttl = timedelta(seconds=db_ttl_seconds)
+        self._writes_since_trim = 0
+        self._counter_lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(note_title, note_content):
+        raw = "\0".join([SUMMARY_PROMPT_VERSION, note_title, note_content])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _count(self, counter):
+        with self._counter_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, note_title, note_content):
+        key = self.make_key(note_title, note_content)
+
+        result = self.memory.get(key)
+        if result is not None:
+            self._count('memory_hits')
+            return result
+
+        result = self._db_get(key)
+        if result is not None:
+            self.memory.set(key, result)
+            self._count('db_hits')
+            return result
+
+        self._count('misses')
+        return None
+
+    def set(self, note_title, note_content, result):
+        key = self.make_key(note_title, note_content)
+        self.memory.set(key, result)
+        self._db_set(key, result)
+
+    def invalidate_many(self, texts, session):
+        """Forget the results for several (title, content) pairs.
+
+        The rows are deleted with one statement in the caller's session, so they
+        go in the same commit as the edits that made them stale.
+        """
+        keys = {self.make_key(note_title, note_content) for note_title, note_content in texts}
+        for key in keys:
+            self.memory.invalidate(key)
+        if keys:
+            session.execute(db.delete(AICacheEntry).where(AICacheEntry.key.in_(keys)))
+
+    def stats(self):
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'db_hits': self.db_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.memory_hits + self.db_hits) / lookups, 3) if lookups else 0,
+            'memory_entries': len(self.memory)
+        }
+
+    # Reads and writes of the persistent tier use their own short-lived session so they
+    # never commit, or get rolled back with, the caller's unit of work. Failures only cost a miss.
+
+    def _db_get(self, key):
+        if not has_app_context():
+            return None
+        try:
+            with Session(db.engine) as session:
+                entry = session.get(AICacheEntry, key)
+                if entry is None:
+                    return None
+                if datetime.utcnow() - entry.created_at > self.db_ttl:
+                    session.delete(entry)
+                    session.commit()
+                    return None
+                return entry.payload
+        except SQLAlchemyError:
+            return None
+
+    def _db_set(self, key, result):
+        if not has_app_context():
+            return
+        try:
+            with Session(db.engine) as session:
+                session.merge(AICacheEntry(key=key, payload=result, created_at=datetime.utcnow()))
+                session.commit()
+                self._writes_since_trim += 1
+                if self._writes_since_trim >= 100:
+                    self._writes_since_trim = 0
+                    self._db_trim(session)
+        except SQLAlchemyError:
+            pass
+
+    def _db_trim(self, session):
+        """Drop expired rows, then the oldest rows beyond the size limit"""
+        session.query(AICacheEntry).filter(
+            AICacheEntry.created_at < datetime.utcnow() - self.db_ttl
+        ).delete()
+
+        newest_evicted = session.query(AICacheEntry.created_at).order_by(
+            AICacheEntry.created_at.desc()
+        ).offset(self.db_max_entries).first()
+        if newest_evicted:
+            session.query(AICacheEntry).filter(
+                AICacheEntry.created_at <= newest_evicted.created_at
+            ).delete()
+
+        session.commit()
+
+_NON_WORD = re.compile(r'[^\w\s]')
+
+def normalize_answer(answer):
+    """Case-fold, strip punctuation and collapse whitespace so trivially different answers match"""
+    return ' '.join(_NON_WORD.sub(' ', answer.casefold()).split())
+
+class ValidationCache:
+    """In-process cache of answer verdicts.
+
+    Keyed on (note content hash, question, normalized answer), so resubmitting the
+    same answer, or one that differs only in case, spacing or punctuation, reuses
+    the earlier verdict. Editing the note content changes every key for that note.
+    """
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.memory = LRUCache(max_entries, ttl_seconds)
+        self._counter_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(question, user_answer, note_content):
+        content_hash = hashlib.sha256(note_content.encode('utf-8')).hexdigest()
+        raw = "\0".join([content_hash, question, normalize_answer(user_answer)])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, question, user_answer, note_content):
+        is_valid = self.memory.get(self.make_key(question, user_answer, note_content))
+        with self._counter_lock:
+            if is_valid is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return is_valid
+
+    def set(self, question, user_answer, note_content, is_valid):
+        self.memory.set(self.make_key(question, user_answer, note_content), is_valid)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+            'entries': len(self.memory)
+        }
+
+summary_cache = SummaryCache(
+    max_entries=Config.AI_CACHE_MAX_ENTRIES,
+    ttl_seconds=Config.AI_CACHE_TTL_SECONDS,
+    db_max_entries=Config.AI_CACHE_DB_MAX_ENTRIES,
+    db_ttl_seconds=Config.AI_CACHE_DB_TTL_SECONDS
+)
+
+validation_cache = ValidationCache(
+    max_entries=Config.VALIDATION_CACHE_MAX_ENTRIES,
+    ttl_seconds=Config.VALIDATION_CACHE_TTL_SECONDS
+)
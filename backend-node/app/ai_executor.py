@@ -0,0 +1,188 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from .config import Config
+from .metrics import GEMINI_CALLS, GEMINI_CALL_DURATION
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the AI API while the circuit breaker is open"""
+
+class AITimeoutError(Exception):
+    """Raised when an AI call misses its deadline"""
+
+class AIOverloadedError(Exception):
+    """Raised instead of queueing when too many AI calls are already waiting in this process"""
+
+class CircuitBreaker:
+    """Stops calling the AI API once too many recent calls failed or were slow.
+
+    Outcomes of the last ``window_size`` calls are kept; a call counts as bad if it
+    raised, timed out or took longer than ``slow_call_seconds``. Once at least
+    ``min_calls`` are recorded and the bad fraction reaches ``failure_rate`` the
+    circuit opens. After ``cooldown_seconds`` a single trial call is let through
+    (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, window_size, min_calls, failure_rate, slow_call_seconds, cooldown_seconds):
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self._outcomes = deque(maxlen=window_size)  # True for a bad call
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        return self._state
+
+    def allow(self):
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record(self, success, latency):
+        bad = not success or latency > self.slow_call_seconds
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._trial_in_flight = False
+                if bad:
+                    self._open()
+                else:
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+                return
+
+            self._outcomes.append(bad)
+            if len(self._outcomes) >= self.min_calls and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate:
+                self._open()
+
+    def abandon(self):
+        """Hand back an allow() that was never turned into a call, so a half-open trial isn't stranded"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._trial_in_flight = False
+
+    def reset(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._outcomes.clear()
+            self._trial_in_flight = False
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+class AIExecutor:
+    """Shared thread pool for AI calls with bounded concurrency, per-call deadlines and a circuit breaker.
+
+    At most ``max_pending`` calls may be running or queued at once. Under a
+    threaded server this caps how many request threads can be parked on the AI
+    API, so the rest stay free for cheap endpoints. Background callers that
+    fan out many calls use submit_when_free() to wait for a slot instead.
+    """
+
+    def __init__(self, max_concurrency, timeout_seconds, breaker, max_pending=None):
+        self.timeout_seconds = timeout_seconds
+        self.breaker = breaker
+        self.max_pending = max_pending
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._slot_freed = threading.Condition(self._pending_lock)
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='ai-call')
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _release(self, future=None):
+        with self._slot_freed:
+            self._pending -= 1
+            self._slot_freed.notify()
+
+    def _has_slot(self):
+        return self.max_pending is None or self._pending < self.max_pending
+
+    def submit(self, fn, *args, **kwargs):
+        """Start fn on the pool; raises CircuitOpenError or AIOverloadedError without calling it"""
+        return self._submit(fn, args, kwargs, slot_timeout=0)
+
+    def submit_when_free(self, fn, *args, **kwargs):
+        """Like submit(), but wait up to the call deadline for a pending slot instead of failing at once"""
+        return self._submit(fn, args, kwargs, slot_timeout=self.timeout_seconds)
+
+    def _submit(self, fn, args, kwargs, slot_timeout):
+        # Capacity first: allow() may hand out the half-open trial call, which must not be lost to an overload
+        with self._slot_freed:
+            if not self._slot_freed.wait_for(self._has_slot, timeout=slot_timeout):
+                GEMINI_CALLS.labels('overloaded').inc()
+                raise AIOverloadedError(f"{self._pending} AI calls already pending")
+            self._pending += 1
+        if not self.breaker.allow():
+            self._release()
+            GEMINI_CALLS.labels('circuit_open').inc()
+            raise CircuitOpenError("AI circuit breaker is open")
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except BaseException:
+            # e.g. RuntimeError once the pool is shut down: the call never started, so give its slot back
+            self.breaker.abandon()
+            self._release()
+            raise
+        future.submitted_at = time.monotonic()
+        future.add_done_callback(self._release)
+        return future
+
+    def wait(self, future, timeout=None):
+        """Wait for a submitted call until its deadline and record the outcome"""
+        timeout = self.timeout_seconds if timeout is None else timeout
+        remaining = max(0.0, future.submitted_at + timeout - time.monotonic())
+        try:
+            result = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            future.cancel()
+            self._record(future, False, 'timeout')
+            raise AITimeoutError(f"AI call exceeded {timeout}s deadline")
+        except Exception:
+            self._record(future, False, 'error')
+            raise
+        self._record(future, True, 'success')
+        return result
+
+    def _record(self, future, success, outcome):
+        latency = time.monotonic() - future.submitted_at
+        self.breaker.record(success, latency)
+        GEMINI_CALLS.labels(outcome).inc()
+        GEMINI_CALL_DURATION.observe(latency)
+
+    def call(self, fn, *args, **kwargs):
+        return self.wait(self.submit(fn, *args, **kwargs))
+
+ai_executor = AIExecutor(
+    max_concurrency=Config.AI_MAX_CONCURRENCY,
+    timeout_seconds=Config.AI_CALL_TIMEOUT_SECONDS,
+    max_pending=Config.AI_MAX_PENDING,
+    breaker=CircuitBreaker(
+        window_size=Config.AI_BREAKER_WINDOW,
+        min_calls=Config.AI_BREAKER_MIN_CALLS,
+        failure_rate=Config.AI_BREAKER_FAILURE_RATE,
+        slow_call_seconds=Config.AI_BREAKER_SLOW_CALL_SECONDS,
+        cooldown_seconds=Config.AI_BREAKER_COOLDOWN_SECONDS
+    )
+)
@@ -1,65 +1,106 @@
-import google.generativeai as genai
-from flask import current_app
+from .ai_cache import summary_cache, validation_cache
+from .ai_executor import ai_executor
+from .config import Config
+from .metrics import GEMINI_FALLBACKS
 import json
+import logging
 import os
 import re
+import threading
+
+logger = logging.getLogger(__name__)
+# Per-call chatter; sampled by default (LOG_SAMPLE_RATES), raw responses only at DEBUG
+call_logger = logging.getLogger(f'{__name__}.calls')
 
 class GeminiService:
+    # Tried in order of preference when GEMINI_MODEL isn't set
+    MODEL_NAMES = [
+        'gemini-1.5-flash',
+        'gemini-1.5-pro', 
+        'gemini-pro',
+        'models/gemini-1.5-flash',
+        'models/gemini-1.5-pro',
+        'models/gemini-pro'
+    ]
+    
     def __init__(self):
-        api_key = os.getenv('GEMINI_API_KEY')
-        self.api_key_available = bool(api_key)
-        self.model = None
-        
-        if api_key:
+        # Nothing is imported or probed until the first AI call, so workers boot fast
+        self._model = None
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        self.model_name = None
+    
+    @property
+    def api_key_available(self):
+        return bool(os.getenv('GEMINI_API_KEY'))
+    
+    @property
+    def model(self):
+        if not self._initialized:
+            self._initialize()
+        return self._model
+    
+    @model.setter
+    def model(self, model):
+        self._model = model
+        self._initialized = True
+    
+    def _initialize(self):
+        """Configure the client and pick a model, once per process"""
+        with self._init_lock:
+            if self._initialized:
+                return
+            self._model = None
+            self._initialized = True
+            
+            api_key = os.getenv('GEMINI_API_KEY')
+            if not api_key:
+                logger.warning("GEMINI_API_KEY not found in environment variables")
+                return
+            
             try:
+                import google.generativeai as genai  # Slow import, deferred to first use
                 genai.configure(api_key=api_key)
-                
-                # Try different model names in order of preference
-                model_names = [
-                    'gemini-1.5-flash',
-                    'gemini-1.5-pro', 
-                    'gemini-pro',
-                    'models/gemini-1.5-flash',
-                    'models/gemini-1.5-pro',
-                    'models/gemini-pro'
-                ]
-                
-                for model_name in model_names:
-                    try:
-                        self.model = genai.GenerativeModel(model_name)
-                        print(f"✅ Gemini AI initialized successfully with {model_name}")
-                        break
-                    except Exception as model_error:
-                        print(f"⚠️ Failed to initialize {model_name}: {model_error}")
-                        continue
-                
-                if not self.model:
-                    print("❌ All Gemini model names failed. Using fallback mode.")
-                    
             except Exception as e:
-                print(f"❌ Failed to configure Gemini AI: {e}")
-                self.model = None
-        else:
-            print("⚠️ GEMINI_API_KEY not found in environment variables")
-            self.model = None
+                logger.error("Failed to configure Gemini AI", extra={'error': str(e)})
+                return
+            
+            # A configured model name skips the probe entirely
+            model_names = [Config.GEMINI_MODEL] if Config.GEMINI_MODEL else self.MODEL_NAMES
+            for model_name in model_names:
+                try:
+                    self._model = genai.GenerativeModel(model_name)
+                    self.model_name = model_name
+                    logger.info("Gemini AI initialized", extra={'model': model_name})
+                    break
+                except Exception as model_error:
+                    logger.warning("Failed to initialize Gemini model", extra={'model': model_name, 'error': str(model_error)})
+                    continue
+            
+            if not self._model:
+                logger.error("All Gemini model names failed, using fallback mode")
+    
+    def _call_model(self, prompt):
+        """Send a prompt through the shared AI executor (bounded concurrency, deadline, circuit breaker)"""
+        response = ai_executor.call(
+            self.model.generate_content, prompt,
+            request_options={'timeout': Config.AI_CALL_TIMEOUT_SECONDS}
+        )
+        return response.text.strip()
     
-    def generate_summary_and_questions(self, note_title, note_content):
-        """Generate AI summary and related questions for a note"""
-        print(f"🤖 Generating AI content for note: {note_title}")
+    def _submit_model(self, prompt):
+        """Start a prompt on the shared AI executor without waiting for its result, for fanning out bulk calls.
         
-        if not self.model:
-            print("📝 Using fallback questions (no AI model)")
-            # Fallback if no API key
-            return {
-                "summary": f"Summary for '{note_title}': This note contains important information that should be reviewed regularly to maintain strong memory retention.",
-                "questions": [
-                    f"What are the main concepts covered in '{note_title}'?",
-                    f"How can you apply the knowledge from '{note_title}' in practice?", 
-                    f"What additional information would strengthen your understanding of '{note_title}'?"
-                ]
-            }
-            
-        prompt = f"""
+        Bulk callers run in the background, so they wait for a free slot rather than
+        failing past AI_MAX_PENDING.
+        """
+        return ai_executor.submit_when_free(
+            self.model.generate_content, prompt,
+            request_options={'timeout': Config.AI_CALL_TIMEOUT_SECONDS}
+        )
+    
+    def _summary_prompt(self, note_title, note_content):
+        return f"""
         You are a memory retention expert. Analyze this note and provide EXACTLY the following JSON structure:
 
         Note Title: {note_title}
@@ -77,48 +118,216 @@ class GeminiService:
         
         Make sure questions are specific to the actual content, not generic.
         """
+    
+    def _parse_summary(self, note_title, note_content, response_text):
+        """Extract the summary/questions JSON from a response and cache it"""
+        call_logger.debug("Raw AI response", extra={'response_preview': response_text[:200]})
         
-        try:
-            print("🔄 Calling Gemini API...")
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip()
-            print(f"📥 Raw AI response: {response_text[:200]}...")
-            
-            # Try to extract JSON from response (sometimes AI adds extra text)
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                json_text = json_match.group()
-                result = json.loads(json_text)
-                print("✅ Successfully parsed AI response")
-                return result
-            else:
-                raise ValueError("No JSON found in AI response")
-                
-        except Exception as e:
-            print(f"❌ Gemini AI Error: {str(e)}")
-            if current_app:
-                current_app.logger.error(f"Gemini AI Error: {str(e)}")
-            
-            # Enhanced fallback based on content
+        # Try to extract JSON from response (sometimes AI adds extra text)
+        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+        if not json_match:
+            raise ValueError("No JSON found in AI response")
+        
+        result = json.loads(json_match.group())
+        if not isinstance(result, dict) or 'summary' not in result or 'questions' not in result:
+            raise ValueError("AI response is missing summary or questions")
+        summary_cache.set(note_title, note_content, result)
+        return result
+    
+    def _fallback_summary(self, note_title, error):
+        GEMINI_FALLBACKS.labels('summary').inc()
+        logger.warning("Gemini AI error, using fallback summary", extra={'error': str(error)})
+        
+        # Enhanced fallback based on content
+        return {
+            "summary": f"This note covers {note_title} with detailed information that requires careful study and regular review to maintain in active memory.",
+            "questions": [
+                f"What are the key principles or concepts explained in this {note_title} note?",
+                f"Can you provide examples or applications of the concepts from {note_title}?",
+                f"How does the information in {note_title} connect to what you already know?"
+            ]
+        }
+    
+    def generate_summary_and_questions(self, note_title, note_content, fallback=True):
+        """Generate AI summary and related questions for a note.
+        
+        With fallback=False an AI error is raised instead of returning generic content,
+        so callers that can retry later (the enrichment worker) get the chance to.
+        """
+        call_logger.info("Generating AI content", extra={'note_title': note_title})
+        
+        if not self.model:
+            call_logger.info("Using fallback questions (no AI model)")
+            GEMINI_FALLBACKS.labels('summary').inc()
+            # Fallback if no API key
             return {
-                "summary": f"This note covers {note_title} with detailed information that requires careful study and regular review to maintain in active memory.",
+                "summary": f"Summary for '{note_title}': This note contains important information that should be reviewed regularly to maintain strong memory retention.",
                 "questions": [
-                    f"What are the key principles or concepts explained in this {note_title} note?",
-                    f"Can you provide examples or applications of the concepts from {note_title}?",
-                    f"How does the information in {note_title} connect to what you already know?"
+                    f"What are the main concepts covered in '{note_title}'?",
+                    f"How can you apply the knowledge from '{note_title}' in practice?", 
+                    f"What additional information would strengthen your understanding of '{note_title}'?"
                 ]
             }
+        
+        cached = summary_cache.get(note_title, note_content)
+        if cached is not None:
+            call_logger.info("Using cached AI content")
+            return cached
+        
+        try:
+            response_text = self._call_model(self._summary_prompt(note_title, note_content))
+            return self._parse_summary(note_title, note_content, response_text)
+        except Exception as e:
+            if not fallback:
+                logger.error("Gemini AI error", extra={'error': str(e)})
+                raise
+            return self._fallback_summary(note_title, e)
+    
+    def _pack_batches(self, notes):
+        """Group notes into prompts that stay under the token budget (roughly 4 characters per token)"""
+        batches, batch, batch_tokens = [], [], 0
+        for note in notes:
+            note_tokens = (len(note.title) + len(note.content)) // 4 + 50
+            if batch and (batch_tokens + note_tokens > Config.AI_BATCH_TOKEN_BUDGET or len(batch) >= Config.AI_BATCH_MAX_NOTES):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(note)
+            batch_tokens += note_tokens
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def _batch_prompt(self, notes):
+        notes_text = "\n\n".join(
+            f"Note ID: {note.id}\nNote Title: {note.title}\nNote Content: {note.content}"
+            for note in notes
+        )
+        return f"""
+        You are a memory retention expert. Analyze each of the following notes.
+
+        {notes_text}
+
+        Return ONLY a valid JSON array with one object per note, in this exact format:
+        [
+            {{
+                "id": <the Note ID>,
+                "summary": "Write a clear 2-sentence summary of the main concepts",
+                "questions": [
+                    "Specific question about key concepts from the content",
+                    "Question about practical applications or examples",
+                    "Question about connections to other topics or deeper understanding"
+                ]
+            }}
+        ]
+
+        Make sure questions are specific to each note's actual content, not generic.
+        """
+    
+    def _parse_batch(self, response_text):
+        """Pull the well-formed entries out of a batch response, keyed by note id"""
+        json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
+        if not json_match:
+            raise ValueError("No JSON array found in AI batch response")
+        
+        results = {}
+        for item in json.loads(json_match.group()):
+            if not isinstance(item, dict) or 'summary' not in item or 'questions' not in item:
+                continue
+            try:
+                note_id = int(item['id'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            results[note_id] = {'summary': item['summary'], 'questions': item['questions']}
+        return results
+    
+    def generate_summaries_and_questions_batch(self, notes, fallback=True):
+        """Generate summaries and questions for many notes with as few API calls as possible.
+        
+        Notes are packed into prompts under AI_BATCH_TOKEN_BUDGET and all prompts are
+        fanned out through the shared executor in parallel. Notes missing from a batch
+        response, or whose whole batch failed, are retried individually (also in
+        parallel). Returns {note_id: result}; with fallback=False notes that still fail
+        are left out so the caller can retry them.
+        """
+        results = {}
+        remaining = []
+        for note in notes:
+            cached = summary_cache.get(note.title, note.content) if self.model else None
+            if cached is not None:
+                results[note.id] = cached
+            else:
+                remaining.append(note)
+        
+        if not self.model:
+            for note in remaining:
+                results[note.id] = self.generate_summary_and_questions(note.title, note.content)
+            return results
+        
+        # Single notes skip the batch format and go straight to the per-note prompt
+        batch_calls = []
+        singles = []
+        for batch in self._pack_batches(remaining):
+            if len(batch) == 1:
+                singles.extend(batch)
+                continue
+            try:
+                call_logger.info("Calling Gemini for a batch", extra={'notes': len(batch)})
+                batch_calls.append((batch, self._submit_model(self._batch_prompt(batch))))
+            except Exception as e:
+                logger.warning("Gemini AI batch error", extra={'error': str(e), 'notes': len(batch)})
+                singles.extend(batch)
+        
+        for batch, future in batch_calls:
+            batch_results = {}
+            try:
+                batch_results = self._parse_batch(ai_executor.wait(future).text.strip())
+            except Exception as e:
+                logger.error("Gemini AI batch error", extra={'error': str(e), 'notes': len(batch)})
+            
+            for note in batch:
+                result = batch_results.get(note.id)
+                if result is None:
+                    singles.append(note)  # Only the notes the batch couldn't answer are retried
+                    continue
+                summary_cache.set(note.title, note.content, result)
+                results[note.id] = result
+        
+        single_calls = []
+        for note in singles:
+            try:
+                single_calls.append((note, self._submit_model(self._summary_prompt(note.title, note.content))))
+            except Exception as e:
+                single_calls.append((note, e))
+        
+        for note, future in single_calls:
+            try:
+                if isinstance(future, Exception):
+                    raise future
+                response_text = ai_executor.wait(future).text.strip()
+                results[note.id] = self._parse_summary(note.title, note.content, response_text)
+            except Exception as e:
+                if fallback:
+                    results[note.id] = self._fallback_summary(note.title, e)
+                else:
+                    logger.warning("Gemini AI error", extra={'note_id': note.id, 'error': str(e)})
+        
+        return results
     
     def validate_answer(self, question, user_answer, note_content):
         """Check if user's answer demonstrates understanding"""
-        print(f"🔍 Validating answer for question: {question[:50]}...")
+        call_logger.info("Validating answer", extra={'question': question[:50]})
         
         if not self.model:
-            print("📝 Using fallback validation (no AI model)")
+            GEMINI_FALLBACKS.labels('validation').inc()
             # If AI fails, be generous and accept any non-empty answer
             is_valid = len(user_answer.strip()) > 10
-            print(f"✅ Fallback validation result: {is_valid}")
+            call_logger.info("Fallback validation (no AI model)", extra={'is_valid': is_valid})
             return is_valid
+        
+        cached = validation_cache.get(question, user_answer, note_content)
+        if cached is not None:
+            call_logger.info("Cached validation result", extra={'is_valid': cached})
+            return cached
             
         prompt = f"""
         Evaluate if this answer shows good understanding of the note content.
@@ -132,17 +341,16 @@ class GeminiService:
         """
         
         try:
-            print("🔄 Calling Gemini API for validation...")
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip().upper()
+            response_text = self._call_model(prompt).upper()
             is_valid = "VALID" in response_text
-            print(f"✅ AI validation result: {is_valid} (response: {response_text})")
+            call_logger.info("AI validation result", extra={'is_valid': is_valid, 'response_preview': response_text[:50]})
+            validation_cache.set(question, user_answer, note_content, is_valid)
             return is_valid
         except Exception as e:
-            print(f"❌ AI validation error: {e}")
+            GEMINI_FALLBACKS.labels('validation').inc()
             # If AI fails, be generous and accept any non-empty answer
             is_valid = len(user_answer.strip()) > 10
-            print(f"📝 Fallback validation result: {is_valid}")
+            logger.warning("AI validation error, using fallback validation", extra={'error': str(e), 'is_valid': is_valid})
             return is_valid
 
 gemini_service = GeminiService()
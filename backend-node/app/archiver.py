@@ -0,0 +1,158 @@
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from . import db
+from .models import Note, NoteStatus
+from .enrichment import enqueue_enrichment
+from .events import prune_events
+from .metrics import NOTES_AUTO_ARCHIVED, start_metrics_server
+
+logger = logging.getLogger(__name__)
+
+class ExpiryArchiver:
+    """Archive notes the moment they expire, driven by a min-heap of upcoming expiries.
+
+    Only notes expiring within ``horizon_seconds`` are kept in memory. The heap is
+    topped up every ``refresh_seconds``, which is how new and touched notes are
+    picked up; entries made stale by a touch are skipped lazily when popped.
+
+    A refresh loads at most ``refresh_limit`` notes, earliest expiry first, and
+    due notes are archived ``batch_size`` per transaction, so a large backlog of
+    overdue notes (e.g. on first deploy) drains in bounded steps.
+
+    Every ``event_retention_seconds / 10`` it also prunes note_event rows past
+    their retention, since they are written whether or not anyone streams them.
+    """
+
+    def __init__(self, horizon_seconds=300, refresh_seconds=30, event_retention_seconds=3600,
+                 refresh_limit=5000, batch_size=500):
+        self.horizon = timedelta(seconds=horizon_seconds)
+        self.refresh_interval = timedelta(seconds=refresh_seconds)
+        self.refresh_limit = refresh_limit
+        self.batch_size = batch_size
+        self.event_retention_seconds = event_retention_seconds
+        self.prune_interval = timedelta(seconds=event_retention_seconds / 10)
+        self._heap = []       # (expires_at, note_id)
+        self._scheduled = {}  # note_id -> expires_at of its live heap entry
+        self._next_refresh = datetime.min
+        self._next_prune = datetime.min
+
+    def refresh(self, now):
+        """Schedule the earliest-expiring active notes that expire before now + horizon"""
+        upcoming = db.session.query(Note.id, Note.expires_at).filter(
+            Note.status == NoteStatus.ACTIVE,
+            Note.expires_at <= now + self.horizon
+        ).order_by(Note.expires_at, Note.id).limit(self.refresh_limit).all()
+
+        for note_id, expires_at in upcoming:
+            if self._scheduled.get(note_id) != expires_at:
+                self._scheduled[note_id] = expires_at
+                heapq.heappush(self._heap, (expires_at, note_id))
+
+        if len(upcoming) >= self.refresh_limit:
+            # More are waiting; come back for them as soon as these are archived
+            self._next_refresh = now
+        else:
+            self._next_refresh = now + self.refresh_interval
+        return len(upcoming)
+
+    def pop_due(self, now):
+        """Pop the ids of all scheduled notes whose expiry has passed"""
+        due_ids = []
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, note_id = heapq.heappop(self._heap)
+            if self._scheduled.get(note_id) != expires_at:
+                continue  # Superseded by a newer entry for the same note
+            del self._scheduled[note_id]
+            due_ids.append(note_id)
+        return due_ids
+
+    def archive_due(self, now):
+        """Archive due notes a batch per transaction, re-checking expiry in the database in case they were touched"""
+        due_ids = self.pop_due(now)
+        archived_count = 0
+
+        for start in range(0, len(due_ids), self.batch_size):
+            notes = Note.query.filter(
+                Note.id.in_(due_ids[start:start + self.batch_size]),
+                Note.status == NoteStatus.ACTIVE,
+                Note.expires_at <= now
+            ).all()
+            if not notes:
+                continue
+
+            for note in notes:
+                note.archive()
+
+            # AI summary and questions are filled in later by the enrichment worker
+            enqueue_enrichment(notes)
+
+            db.session.commit()
+            db.session.expunge_all()
+            NOTES_AUTO_ARCHIVED.labels('archiver').inc(len(notes))
+            archived_count += len(notes)
+
+        if archived_count:
+            logger.info("Archived expired notes", extra={'archived_count': archived_count, 'due_count': len(due_ids)})
+
+        return archived_count
+
+    def prune_old_events(self, now):
+        """Drop note events nobody can replay any more"""
+        self._next_prune = now + self.prune_interval
+        pruned = prune_events(self.event_retention_seconds)
+        if pruned:
+            logger.info("Pruned note events", extra={'pruned_count': pruned})
+        return pruned
+
+    def next_wakeup(self):
+        """Earliest of the next due note, the next scheduled refresh and the next event prune"""
+        if self._heap:
+            return min(self._heap[0][0], self._next_refresh, self._next_prune)
+        return min(self._next_refresh, self._next_prune)
+
+    def run_once(self):
+        now = datetime.utcnow()
+        try:
+            if now >= self._next_prune:
+                self.prune_old_events(now)
+            if now >= self._next_refresh:
+                self.refresh(now)
+            return self.archive_due(now)
+        finally:
+            # Don't sit idle in a transaction while sleeping
+            db.session.remove()
+
+    def run_forever(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.exception("Archiver pass failed", extra={'error': str(e)})
+                self._next_refresh = datetime.min  # Rebuild the schedule on the next pass
+
+            delay = (self.next_wakeup() - datetime.utcnow()).total_seconds()
+            if delay > 0:
+                time.sleep(delay)
+
+@click.command('run-archiver')
+@with_appcontext
+def run_archiver_command():
+    """Run the background archiver that archives notes as they expire."""
+    current_app.logger.setLevel(logging.INFO)
+    archiver = ExpiryArchiver(
+        horizon_seconds=current_app.config['ARCHIVER_HORIZON_SECONDS'],
+        refresh_seconds=current_app.config['ARCHIVER_REFRESH_SECONDS'],
+        event_retention_seconds=current_app.config['EVENTS_RETENTION_SECONDS'],
+        refresh_limit=current_app.config['ARCHIVER_REFRESH_LIMIT'],
+        batch_size=current_app.config['ARCHIVE_SWEEP_BATCH_SIZE']
+    )
+    start_metrics_server(current_app._get_current_object(), current_app.config['ARCHIVER_METRICS_PORT'])
+    click.echo("Archiver started")
+    archiver.run_forever()
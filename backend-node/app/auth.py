@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify, url_for
 from .models import User
+from .password_hasher import PasswordHasherBusyError
 from . import db, bcrypt, jwt
-from .utils import generate_confirmation_token, confirm_token, send_email
+from .utils import generate_confirmation_token, confirm_token
+from .outbox import queue_email
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, create_refresh_token
 
 auth_bp = Blueprint('auth', __name__)
@@ -21,6 +23,12 @@ def missing_token_callback(error):
         "error": str(error)
     }), 401
 
+@auth_bp.errorhandler(PasswordHasherBusyError)
+def password_hasher_busy(error):
+    response = jsonify({"error": "Server is busy, please try again shortly."})
+    response.headers['Retry-After'] = '2'
+    return response, 503
+
 @auth_bp.route('/signup', methods=['POST'])
 def signup():
     data = request.get_json()
@@ -37,7 +45,6 @@ def signup():
     new_user = User(username=username, email=email)
     new_user.set_password(password)
     db.session.add(new_user)
-    db.session.commit()
 
     token = generate_confirmation_token(new_user.email)
     verify_url = url_for('auth.verify_email', token=token, _external=True)
@@ -63,7 +70,9 @@ def signup():
         </p>
     </div>
     """
-    send_email(new_user.email, "Please confirm your email", html_body)
+    # Delivered by the email worker; committed together with the new user
+    queue_email(new_user.email, "Please confirm your email", html_body)
+    db.session.commit()
 
     return jsonify({"message": "User created. Please check your email to verify your account."}), 201
 
@@ -126,9 +135,11 @@ def resend_verification():
     """
     
     try:
-        send_email(user.email, "Verify Your Email Address", html_body)
+        queue_email(user.email, "Verify Your Email Address", html_body)
+        db.session.commit()
         return jsonify({"message": "Verification email sent successfully"}), 200
     except Exception as e:
+        db.session.rollback()
         return jsonify({"error": "Failed to send verification email"}), 500
 
 
@@ -146,6 +157,11 @@ def login():
     if not user.is_verified:
         return jsonify({"error": "Account not verified. Please check your email."}), 403
 
+    # Upgrade hashes made with an older work factor while we have the plaintext
+    if user.password_needs_rehash():
+        user.set_password(password)
+        db.session.commit()
+
     access_token = create_access_token(identity=str(user.id))
     refresh_token = create_refresh_token(identity=str(user.id))
 
@@ -186,7 +202,8 @@ def reset_password_request():
         token = generate_confirmation_token(user.email)
         reset_url = f"http://localhost:5000/api/auth/reset-password/{token}"
         html_body = f"<p>You requested a password reset. Click the link below:</p><p><a href='{reset_url}'>{reset_url}</a></p>"
-        send_email(user.email, "Password Reset Request", html_body)
+        queue_email(user.email, "Password Reset Request", html_body)
+        db.session.commit()
 
     return jsonify({"message": "If an account with that email exists, a password reset link has been sent."}), 200
 
@@ -8,6 +8,17 @@ class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "secret-key")
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URI", "sqlite:///site.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Per gunicorn worker process: each holds up to pool_size + max_overflow connections
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT_SECONDS', 30)),  # Wait for a free connection before erroring
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE_SECONDS', 1800)),  # Replace connections before the server drops them
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() in ['true', 'on', '1']
+    }
+    # Optional read replica; read-only note endpoints use it unless the user wrote recently
+    SQLALCHEMY_BINDS = {'replica': os.getenv('DATABASE_REPLICA_URI')} if os.getenv('DATABASE_REPLICA_URI') else {}
+    READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', 5))  # Keep a user on the primary this long after a write
     SECURITY_PASSWORD_SALT = os.getenv("SECURITY_PASSWORD_SALT", "my-secret-salt")
 
 
@@ -18,11 +29,25 @@ class Config:
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD', 'your-email-password')
     MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER', 'noreply@example.com')
 
+    # Email outbox delivery
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', 50))  # Emails sent per SMTP connection
+    EMAIL_OUTBOX_POLL_SECONDS = int(os.getenv('EMAIL_OUTBOX_POLL_SECONDS', 2))  # Idle wait when the outbox is empty
+    EMAIL_OUTBOX_LEASE_SECONDS = int(os.getenv('EMAIL_OUTBOX_LEASE_SECONDS', 120))  # Claimed emails are reclaimed after this
+    EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', 8))
+    EMAIL_OUTBOX_BACKOFF_SECONDS = int(os.getenv('EMAIL_OUTBOX_BACKOFF_SECONDS', 30))  # Doubles after each failed attempt
+    EMAIL_OUTBOX_BACKOFF_MAX_SECONDS = int(os.getenv('EMAIL_OUTBOX_BACKOFF_MAX_SECONDS', 3600))
+
     FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:3000')
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
+    
+    # Password hashing
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))  # Work factor; older hashes are upgraded on login
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))  # Processes per web worker; 0 hashes inline
+    PASSWORD_HASH_MAX_QUEUE = int(os.getenv('PASSWORD_HASH_MAX_QUEUE', 32))  # Waiting hashes before new ones get a 503
+    PASSWORD_HASH_TIMEOUT_SECONDS = float(os.getenv('PASSWORD_HASH_TIMEOUT_SECONDS', 10))
 
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", SECRET_KEY)
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=60)
@@ -33,13 +58,106 @@ class Config:
 
     # Gemini AI Configuration
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+    GEMINI_MODEL = os.getenv('GEMINI_MODEL')  # Skips probing MODEL_NAMES on first use when set
     
     # Note decay settings
     DEFAULT_DECAY_MINUTES = 1440  # 24 hours
     MAX_DECAY_MINUTES = 10080     # 1 week
     MIN_DECAY_MINUTES = 1         # 1 minute
     
+    # Note list pagination
+    NOTES_PAGE_DEFAULT_LIMIT = 100
+    NOTES_PAGE_MAX_LIMIT = 500
+    
+    # Bulk note import
+    NOTES_IMPORT_BATCH_SIZE = int(os.getenv('NOTES_IMPORT_BATCH_SIZE', 500))  # Rows per executemany INSERT
+    NOTES_IMPORT_MAX_ROWS = int(os.getenv('NOTES_IMPORT_MAX_ROWS', 10000))
+    NOTES_IMPORT_ENQUEUE_ENRICHMENT = os.getenv('NOTES_IMPORT_ENQUEUE_ENRICHMENT', 'false').lower() in ['true', 'on', '1']
+    
+    # Batch note mutations
+    NOTES_BATCH_MAX_IDS = int(os.getenv('NOTES_BATCH_MAX_IDS', 500))  # Note ids across all operations in one request
+    
+    # Note export streaming
+    NOTES_EXPORT_YIELD_PER = int(os.getenv('NOTES_EXPORT_YIELD_PER', 500))  # Rows fetched per round trip
+    NOTES_EXPORT_CHUNK_BYTES = int(os.getenv('NOTES_EXPORT_CHUNK_BYTES', 64 * 1024))  # Bytes buffered before each write
+    
     # Penalty system settings
     PENALTY_PERCENTAGE_PER_WRONG_ANSWER = 0.125  # 12.5% reduction per wrong answer
     MAX_PENALTY_PERCENTAGE = 0.625  # Maximum 62.5% reduction
     MIN_DECAY_AFTER_PENALTY = 30  # Minimum 30 minutes even with max penalties
+    
+    # Background archiver settings
+    ARCHIVER_HORIZON_SECONDS = int(os.getenv('ARCHIVER_HORIZON_SECONDS', 300))  # How far ahead expiries are held in memory
+    ARCHIVER_REFRESH_SECONDS = int(os.getenv('ARCHIVER_REFRESH_SECONDS', 30))   # How often new and touched notes are picked up
+    ARCHIVER_REFRESH_LIMIT = int(os.getenv('ARCHIVER_REFRESH_LIMIT', 5000))  # Most expiries loaded per refresh; a backlog drains in steps
+    ARCHIVE_SWEEP_BATCH_SIZE = int(os.getenv('ARCHIVE_SWEEP_BATCH_SIZE', 500))  # Notes per committed batch in the sweep and the archiver
+    
+    # Coalesced touch-on-read
+    TOUCH_BUFFER_FLUSH_SECONDS = float(os.getenv('TOUCH_BUFFER_FLUSH_SECONDS', 1))  # 0 writes every touch straight through
+    TOUCH_BUFFER_MAX_PENDING = int(os.getenv('TOUCH_BUFFER_MAX_PENDING', 1000))  # Flush early once this many notes are waiting
+    TOUCH_BUFFER_WRITE_THROUGH_SECONDS = int(os.getenv('TOUCH_BUFFER_WRITE_THROUGH_SECONDS', 60))  # Touches this close to expiry skip the buffer
+    
+    # Server-sent note events
+    EVENTS_POLL_SECONDS = float(os.getenv('EVENTS_POLL_SECONDS', 1))  # How often each worker relays new events
+    EVENTS_HEARTBEAT_SECONDS = int(os.getenv('EVENTS_HEARTBEAT_SECONDS', 15))  # Keep-alive comment on idle streams
+    EVENTS_STREAM_MAX_SECONDS = int(os.getenv('EVENTS_STREAM_MAX_SECONDS', 1800))  # Clients reconnect with Last-Event-ID after this
+    EVENTS_EXPIRING_SOON_SECONDS = int(os.getenv('EVENTS_EXPIRING_SOON_SECONDS', 300))  # Warn this long before a note decays
+    EVENTS_RETENTION_SECONDS = int(os.getenv('EVENTS_RETENTION_SECONDS', 3600))  # How long events stay replayable
+    EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', 100))  # Buffered events per stream before it is dropped
+    EVENTS_MAX_STREAMS_PER_USER = int(os.getenv('EVENTS_MAX_STREAMS_PER_USER', 5))
+    # Streams are served by the gevent events server (gunicorn_events.conf.py), where one costs a greenlet;
+    # on the threaded web server each would pin a request thread, so none are accepted there by default
+    EVENTS_MAX_STREAMS_PER_WORKER = int(os.getenv(
+        'EVENTS_MAX_STREAMS_PER_WORKER',
+        5000 if os.getenv('GUNICORN_WORKER_CLASS', 'gthread') == 'gevent' else 0
+    ))
+    EVENTS_TOKEN_SECONDS = int(os.getenv('EVENTS_TOKEN_SECONDS', 60))  # Lifetime of the ?token= used to open a stream
+    
+    # AI enrichment job queue settings
+    ENRICHMENT_WORKER_THREADS = int(os.getenv('ENRICHMENT_WORKER_THREADS', 4))
+    ENRICHMENT_CLAIM_BATCH_SIZE = int(os.getenv('ENRICHMENT_CLAIM_BATCH_SIZE', 10))  # Jobs leased per claim
+    ENRICHMENT_POLL_SECONDS = int(os.getenv('ENRICHMENT_POLL_SECONDS', 2))  # Idle wait when the queue is empty
+    ENRICHMENT_LEASE_SECONDS = int(os.getenv('ENRICHMENT_LEASE_SECONDS', 300))  # Running jobs are reclaimed after this
+    ENRICHMENT_MAX_ATTEMPTS = int(os.getenv('ENRICHMENT_MAX_ATTEMPTS', 5))
+    ENRICHMENT_BACKOFF_SECONDS = int(os.getenv('ENRICHMENT_BACKOFF_SECONDS', 30))  # Doubles after each failed attempt
+    ENRICHMENT_BACKOFF_MAX_SECONDS = int(os.getenv('ENRICHMENT_BACKOFF_MAX_SECONDS', 3600))
+    
+    # Generated summary/questions cache settings
+    AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', 1000))  # In-process LRU tier, per worker
+    AI_CACHE_TTL_SECONDS = int(os.getenv('AI_CACHE_TTL_SECONDS', 3600))
+    AI_CACHE_DB_MAX_ENTRIES = int(os.getenv('AI_CACHE_DB_MAX_ENTRIES', 50000))  # Shared database tier
+    AI_CACHE_DB_TTL_SECONDS = int(os.getenv('AI_CACHE_DB_TTL_SECONDS', 30 * 24 * 3600))
+    VALIDATION_CACHE_MAX_ENTRIES = int(os.getenv('VALIDATION_CACHE_MAX_ENTRIES', 10000))  # Answer verdicts, per worker
+    VALIDATION_CACHE_TTL_SECONDS = int(os.getenv('VALIDATION_CACHE_TTL_SECONDS', 24 * 3600))
+    
+    # Batched summary/questions generation
+    AI_BATCH_TOKEN_BUDGET = int(os.getenv('AI_BATCH_TOKEN_BUDGET', 6000))  # Estimated prompt tokens per batched call
+    AI_BATCH_MAX_NOTES = int(os.getenv('AI_BATCH_MAX_NOTES', 20))
+    
+    # Shared AI executor and circuit breaker
+    AI_MAX_CONCURRENCY = int(os.getenv('AI_MAX_CONCURRENCY', 8))  # Concurrent Gemini calls per process
+    AI_MAX_PENDING = int(os.getenv('AI_MAX_PENDING', 8))  # Running + queued calls per process before new ones fall back; keep below GUNICORN_THREADS
+    AI_CALL_TIMEOUT_SECONDS = float(os.getenv('AI_CALL_TIMEOUT_SECONDS', 20))  # Deadline per call, including queueing
+    AI_BREAKER_WINDOW = int(os.getenv('AI_BREAKER_WINDOW', 20))  # Recent calls considered
+    AI_BREAKER_MIN_CALLS = int(os.getenv('AI_BREAKER_MIN_CALLS', 5))
+    AI_BREAKER_FAILURE_RATE = float(os.getenv('AI_BREAKER_FAILURE_RATE', 0.5))  # Share of failed or slow calls that opens the circuit
+    AI_BREAKER_SLOW_CALL_SECONDS = float(os.getenv('AI_BREAKER_SLOW_CALL_SECONDS', 10))
+    AI_BREAKER_COOLDOWN_SECONDS = float(os.getenv('AI_BREAKER_COOLDOWN_SECONDS', 30))  # Time before a trial call is let through
+
+    # Prometheus metrics on /metrics; set PROMETHEUS_MULTIPROC_DIR when running several worker processes
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ['true', 'on', '1']
+    METRICS_AUTH_TOKEN = os.getenv('METRICS_AUTH_TOKEN')  # When set, scrapes must send 'Authorization: Bearer <token>'
+    METRICS_ALLOWED_NETWORKS = os.getenv('METRICS_ALLOWED_NETWORKS', '127.0.0.0/8,::1/128')  # Who may scrape /metrics without a token
+    # Background processes export on their own port (0 disables); the exporter has no auth, so it binds to loopback by default
+    METRICS_BIND_ADDRESS = os.getenv('METRICS_BIND_ADDRESS', '127.0.0.1')
+    ARCHIVER_METRICS_PORT = int(os.getenv('ARCHIVER_METRICS_PORT', 9101))
+    ENRICHMENT_METRICS_PORT = int(os.getenv('ENRICHMENT_METRICS_PORT', 9102))
+    EMAIL_OUTBOX_METRICS_PORT = int(os.getenv('EMAIL_OUTBOX_METRICS_PORT', 9103))
+    METRICS_PUSHGATEWAY_URL = os.getenv('METRICS_PUSHGATEWAY_URL')  # Where 'flask archive-expired' pushes its counts when done
+
+    # Logging: JSON lines on stdout, written by a background thread
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    LOG_LEVELS = os.getenv('LOG_LEVELS', '')  # Per-logger overrides, e.g. 'app.ai_service.calls=DEBUG,app.notes=WARNING'
+    LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', 'app.ai_service.calls=0.1')  # Fraction of sub-WARNING records kept per logger
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # 'json', or 'text' for reading locally
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))  # Records beyond this are dropped instead of blocking requests
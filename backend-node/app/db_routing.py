@@ -0,0 +1,28 @@
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+
+# Key of the optional read replica in SQLALCHEMY_BINDS
+REPLICA_BIND_KEY = 'replica'
+
+def replica_configured():
+    return has_app_context() and REPLICA_BIND_KEY in (current_app.config.get('SQLALCHEMY_BINDS') or {})
+
+def _is_write(clause):
+    if clause is None:
+        return False
+    if getattr(clause, 'is_dml', False):
+        return True
+    return getattr(clause, '_for_update_arg', None) is not None  # SELECT ... FOR UPDATE locks on the primary
+
+class RoutingSession(Session):
+    """Sends reads to the read replica while the request has opted in (g.use_read_replica).
+    
+    Flushes, INSERT/UPDATE/DELETE and locking SELECTs always go to the primary,
+    so a view marked read-only that does write stays correct.
+    """
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and not _is_write(clause)
+                and replica_configured() and g.get('use_read_replica')):
+            return self._db.engines[REPLICA_BIND_KEY]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
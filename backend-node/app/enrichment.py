@@ -0,0 +1,202 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.orm import selectinload
+
+from . import db
+from .models import EnrichmentJob, EnrichmentStatus, JobStatus
+from .ai_service import gemini_service
+from .metrics import start_metrics_server
+
+logger = logging.getLogger(__name__)
+
+# What the AI call needs from a note, copied out so no session or connection is held during it
+NoteText = namedtuple('NoteText', ['id', 'title', 'content'])
+
+def enqueue_enrichment(notes):
+    """Queue AI enrichment for notes that have no summary or questions yet.
+
+    Jobs are added to the caller's session, so they commit atomically with
+    whatever status change (usually archiving) triggered them.
+    """
+    queued = 0
+    for note in notes:
+        if note.ai_summary and note.ai_questions:
+            continue
+        if note.enrichment_status == EnrichmentStatus.PENDING:
+            continue  # Already queued
+
+        note.enrichment_status = EnrichmentStatus.PENDING
+        db.session.add(EnrichmentJob(note=note))
+        queued += 1
+
+    return queued
+
+def claim_jobs(limit):
+    """Lease up to limit due jobs to this worker.
+
+    Pending jobs whose run_after has passed are due, as are running jobs whose
+    lease expired because their worker died. Rows locked by another worker are
+    skipped on databases that support it; everywhere else (SQLite ignores
+    FOR UPDATE) each lease is a conditional UPDATE on the status and run_after
+    just read, so a job another worker leased first is left to it.
+    """
+    now = datetime.utcnow()
+    candidates = db.session.execute(
+        db.select(EnrichmentJob.id, EnrichmentJob.status, EnrichmentJob.run_after).where(
+            EnrichmentJob.status.in_([JobStatus.PENDING, JobStatus.RUNNING]),
+            EnrichmentJob.run_after <= now
+        ).order_by(EnrichmentJob.run_after).limit(limit).with_for_update(skip_locked=True)
+    ).all()
+
+    lease_until = now + timedelta(seconds=current_app.config['ENRICHMENT_LEASE_SECONDS'])
+    claimed = []
+    for job_id, status, run_after in candidates:
+        result = db.session.execute(
+            db.update(EnrichmentJob)
+            .where(EnrichmentJob.id == job_id, EnrichmentJob.status == status, EnrichmentJob.run_after == run_after)
+            .values(status=JobStatus.RUNNING, run_after=lease_until)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            claimed.append(job_id)
+    db.session.commit()
+
+    return claimed
+
+def _backoff(attempts):
+    """Exponential backoff before the next attempt, capped"""
+    base = current_app.config['ENRICHMENT_BACKOFF_SECONDS']
+    cap = current_app.config['ENRICHMENT_BACKOFF_MAX_SECONDS']
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), cap))
+
+def _record_failure(job, error):
+    """Schedule a retry with backoff, or give up after ENRICHMENT_MAX_ATTEMPTS"""
+    job.attempts += 1
+    job.last_error = error
+
+    if job.attempts >= current_app.config['ENRICHMENT_MAX_ATTEMPTS']:
+        job.status = JobStatus.FAILED
+        job.note.enrichment_status = EnrichmentStatus.FAILED
+        logger.error("Enrichment failed permanently", extra={
+            'job_id': job.id, 'note_id': job.note_id, 'attempts': job.attempts, 'error': error
+        })
+    else:
+        job.status = JobStatus.PENDING
+        job.run_after = datetime.utcnow() + _backoff(job.attempts)
+        logger.warning("Enrichment failed, retrying", extra={
+            'job_id': job.id, 'note_id': job.note_id, 'attempts': job.attempts,
+            'retry_at': job.run_after.isoformat(), 'error': error
+        })
+
+def _running_jobs(job_ids):
+    """The jobs among job_ids still leased, with their notes loaded in one extra query"""
+    return EnrichmentJob.query.options(selectinload(EnrichmentJob.note)).filter(
+        EnrichmentJob.id.in_(job_ids),
+        EnrichmentJob.status == JobStatus.RUNNING
+    ).all()
+
+def process_jobs(job_ids):
+    """Enrich the notes behind a set of claimed jobs; returns how many notes were enriched.
+
+    Notes are sent to Gemini together through the batch API, so a sweep that
+    archived many notes costs a handful of calls rather than one per note. The
+    transaction that read them is committed before the call and the results are
+    written back in a second, short one, so no connection waits on Gemini.
+    """
+    pending_ids = []
+    notes = []
+    for job in _running_jobs(job_ids):
+        if job.note.ai_summary and job.note.ai_questions:
+            job.note.enrichment_status = EnrichmentStatus.READY
+            db.session.delete(job)
+        else:
+            pending_ids.append(job.id)
+            notes.append(NoteText(job.note_id, job.note.title, job.note.content))
+    db.session.commit()
+
+    results = {}
+    if notes:
+        try:
+            results = gemini_service.generate_summaries_and_questions_batch(notes, fallback=False)
+        except Exception as e:
+            logger.error("Batch enrichment failed", extra={'notes': len(notes), 'error': str(e)})
+
+    if not pending_ids:
+        return 0
+
+    enriched = 0
+    for job in _running_jobs(pending_ids):
+        ai_result = results.get(job.note_id)
+        if ai_result is None:
+            _record_failure(job, "AI generation failed")
+            continue
+        if not isinstance(ai_result, dict) or 'summary' not in ai_result or 'questions' not in ai_result:
+            # Fail just this note; a KeyError here would leave the whole claimed batch RUNNING
+            _record_failure(job, "AI result is missing summary or questions")
+            continue
+
+        job.note.ai_summary = ai_result['summary']
+        job.note.ai_questions = ai_result['questions']
+        job.note.enrichment_status = EnrichmentStatus.READY
+        db.session.delete(job)
+        enriched += 1
+
+    db.session.commit()
+    logger.info("Enriched notes", extra={'jobs': len(job_ids), 'enriched_count': enriched})
+    return enriched
+
+def run_worker_loop(app, stop_event, batch_size, poll_seconds):
+    """Claim and process jobs until stop_event is set"""
+    while not stop_event.is_set():
+        with app.app_context():
+            try:
+                job_ids = claim_jobs(batch_size)
+                if job_ids:
+                    process_jobs(job_ids)
+            except Exception as e:
+                db.session.rollback()
+                logger.exception("Enrichment worker error", extra={'error': str(e)})
+                job_ids = []
+            finally:
+                db.session.remove()
+
+        if not job_ids:
+            stop_event.wait(poll_seconds)
+
+@click.command('run-enrichment-worker')
+@click.option('--threads', type=int, default=None, help='Number of worker threads.')
+@with_appcontext
+def run_enrichment_worker_command(threads):
+    """Run the worker pool that fills in AI summaries and questions."""
+    app = current_app._get_current_object()
+    app.logger.setLevel(logging.INFO)
+    threads = threads or app.config['ENRICHMENT_WORKER_THREADS']
+    start_metrics_server(app, app.config['ENRICHMENT_METRICS_PORT'])
+
+    stop_event = threading.Event()
+    workers = [
+        threading.Thread(
+            target=run_worker_loop,
+            args=(app, stop_event, app.config['ENRICHMENT_CLAIM_BATCH_SIZE'], app.config['ENRICHMENT_POLL_SECONDS']),
+            daemon=True
+        )
+        for _ in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+
+    click.echo(f"Enrichment worker started with {threads} threads")
+    try:
+        while any(worker.is_alive() for worker in workers):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop_event.set()
+        for worker in workers:
+            worker.join()
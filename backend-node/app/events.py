@@ -0,0 +1,210 @@
+import json
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from flask import current_app
+from itsdangerous import BadData, URLSafeTimedSerializer
+
+from . import db
+from .models import Note, NoteEvent, NoteStatus, NOTE_EVENT_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Put on a stream's queue when it fell too far behind; the stream ends and the
+# client reconnects with Last-Event-ID to replay what it missed
+STREAM_OVERFLOW = object()
+
+# Signs stream tokens; a separate salt means they can't stand in for any other token
+STREAM_TOKEN_SALT = 'note-event-stream'
+
+# How many ids back each relay pass re-reads, so events whose transaction
+# committed after a later id was already seen are still picked up
+RELAY_ID_LOOKBACK = 200
+
+class TooManyStreamsError(Exception):
+    """Raised when a user already has the maximum number of open event streams"""
+
+class StreamsFullError(Exception):
+    """Raised when this worker already holds as many open event streams as it may"""
+
+def format_sse(event):
+    """Encode an event dict as a server-sent event frame"""
+    lines = []
+    if event.get('id') is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['event']}")
+    lines.append(f"data: {event['data']}")
+    return '\n'.join(lines) + '\n\n'
+
+def issue_stream_token(user_id):
+    """A short-lived token that only opens an event stream, for EventSource clients that can't send headers.
+    
+    Access tokens never go in the URL, where access logs and proxies would keep them.
+    """
+    serializer = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
+    return serializer.dumps(int(user_id), salt=STREAM_TOKEN_SALT)
+
+def load_stream_token(token):
+    """The user id a stream token was issued to, or None if it is invalid or older than EVENTS_TOKEN_SECONDS"""
+    serializer = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
+    try:
+        return int(serializer.loads(token, salt=STREAM_TOKEN_SALT, max_age=current_app.config['EVENTS_TOKEN_SECONDS']))
+    except (BadData, TypeError, ValueError):
+        return None
+
+def event_from_row(row):
+    return {'id': row.id, 'event': row.event_type, 'data': json.dumps(row.payload)}
+
+def prune_events(retention_seconds, batch_size=5000):
+    """Delete note_event rows older than the retention window, a batch per transaction; returns how many"""
+    cutoff = datetime.utcnow() - timedelta(seconds=retention_seconds)
+    pruned = 0
+    while True:
+        event_ids = db.session.scalars(
+            db.select(NoteEvent.id).where(NoteEvent.created_at < cutoff).order_by(NoteEvent.id).limit(batch_size)
+        ).all()
+        if not event_ids:
+            return pruned
+        NoteEvent.query.filter(NoteEvent.id.in_(event_ids)).delete(synchronize_session=False)
+        db.session.commit()
+        pruned += len(event_ids)
+
+def replay_events(user_id, after_id, limit=500):
+    """Events for user_id after after_id that are still retained, oldest first"""
+    rows = NoteEvent.query.filter(
+        NoteEvent.user_id == user_id,
+        NoteEvent.id > after_id
+    ).order_by(NoteEvent.id).limit(limit).all()
+    return [event_from_row(row) for row in rows]
+
+class EventBroker:
+    """In-process fan-out of note events to this worker's open streams.
+    
+    Each subscriber gets a bounded queue. A single relay thread per worker
+    polls the note_event table (written by any process in the same transaction
+    as the change) and pushes new rows to the owners' queues. It also
+    announces note.expiring_soon for subscribed users, so open streams cost a
+    queue each and no per-connection database work.
+    """
+    
+    def __init__(self):
+        self._subscribers = defaultdict(set)  # user_id -> set of queues
+        self._lock = threading.Lock()
+        self._relay = None
+        self._last_event_id = None
+        self._seen_ids = set()
+        self._announced = {}  # note_id -> expires_at already announced as expiring soon
+    
+    def subscribe(self, app, user_id):
+        with self._lock:
+            # On the threaded web server streams would park a request thread each; refuse rather than starve requests
+            if sum(len(subscriptions) for subscriptions in self._subscribers.values()) >= app.config['EVENTS_MAX_STREAMS_PER_WORKER']:
+                raise StreamsFullError("This worker has no free event stream slots")
+            if len(self._subscribers[user_id]) >= app.config['EVENTS_MAX_STREAMS_PER_USER']:
+                raise TooManyStreamsError(f"At most {app.config['EVENTS_MAX_STREAMS_PER_USER']} event streams per user")
+            subscription = queue.Queue(maxsize=app.config['EVENTS_QUEUE_SIZE'])
+            self._subscribers[user_id].add(subscription)
+            if self._relay is None:
+                # Started lazily so it only ever runs in the worker process, after any fork
+                self._relay = threading.Thread(target=self._run_relay, args=(app,), name='note-events-relay', daemon=True)
+                self._relay.start()
+        return subscription
+    
+    def unsubscribe(self, user_id, subscription):
+        with self._lock:
+            self._subscribers[user_id].discard(subscription)
+            if not self._subscribers[user_id]:
+                del self._subscribers[user_id]
+    
+    def publish(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscribers.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.put_nowait(event)
+            except queue.Full:
+                self._drop(user_id, subscription)
+    
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+    
+    def _drop(self, user_id, subscription):
+        self.unsubscribe(user_id, subscription)
+        try:
+            while True:
+                subscription.get_nowait()
+        except queue.Empty:
+            pass
+        subscription.put_nowait(STREAM_OVERFLOW)
+    
+    def _subscribed_user_ids(self):
+        with self._lock:
+            return list(self._subscribers)
+    
+    def relay_once(self, app):
+        """Publish new note_event rows and upcoming expiries to subscribers"""
+        if self._last_event_id is None:
+            # Only relay what happens from now on; reconnects replay by Last-Event-ID
+            self._last_event_id = db.session.query(db.func.max(NoteEvent.id)).scalar() or 0
+            self._seen_ids = set(db.session.scalars(
+                db.select(NoteEvent.id).where(NoteEvent.id > self._last_event_id - RELAY_ID_LOOKBACK)
+            ))
+        
+        rows = NoteEvent.query.filter(
+            NoteEvent.id > self._last_event_id - RELAY_ID_LOOKBACK
+        ).order_by(NoteEvent.id).all()
+        for row in rows:
+            if row.id in self._seen_ids:
+                continue
+            self._seen_ids.add(row.id)
+            self._last_event_id = max(self._last_event_id, row.id)
+            self.publish(row.user_id, event_from_row(row))
+        
+        floor = self._last_event_id - RELAY_ID_LOOKBACK
+        self._seen_ids = {event_id for event_id in self._seen_ids if event_id > floor}
+        
+        self._announce_expiring(app)
+    
+    def _announce_expiring(self, app):
+        user_ids = self._subscribed_user_ids()
+        now = datetime.utcnow()
+        self._announced = {note_id: expires_at for note_id, expires_at in self._announced.items() if expires_at > now}
+        if not user_ids:
+            return
+        
+        # Range scan on (user_id, status, expires_at) for connected users only
+        notes = Note.query.filter(
+            Note.user_id.in_(user_ids),
+            Note.status == NoteStatus.ACTIVE,
+            Note.expires_at > now,
+            Note.expires_at <= now + timedelta(seconds=app.config['EVENTS_EXPIRING_SOON_SECONDS'])
+        ).all()
+        for note in notes:
+            if self._announced.get(note.id) == note.expires_at:
+                continue  # Touching a note moves expires_at, which earns a fresh warning later
+            self._announced[note.id] = note.expires_at
+            self.publish(note.user_id, {
+                'id': None,
+                'event': 'note.expiring_soon',
+                'data': json.dumps(note.to_dict(NOTE_EVENT_FIELDS))
+            })
+    
+    def _run_relay(self, app):
+        while True:
+            with app.app_context():
+                if self._subscribed_user_ids():
+                    try:
+                        self.relay_once(app)
+                    except Exception as e:
+                        db.session.rollback()
+                        logger.error("Note event relay failed", extra={'error': str(e)})
+                    finally:
+                        db.session.remove()
+            time.sleep(app.config['EVENTS_POLL_SECONDS'])
+
+event_broker = EventBroker()
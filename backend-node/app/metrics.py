@@ -0,0 +1,178 @@
+"""Prometheus metrics for requests, SQL, Gemini calls and archiving.
+
+Under gunicorn set PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py does by default)
+before the app is imported; each worker then writes its samples to mmapped
+files there and /metrics aggregates them, whichever worker serves the scrape.
+
+The background processes (archiver, enrichment and email workers) don't serve
+/metrics; each exposes its own samples on a separate port instead (see
+start_metrics_server), and the one-shot archive sweep pushes them to a
+Pushgateway when it finishes.
+"""
+import atexit
+import hmac
+import ipaddress
+import logging
+import os
+import time
+
+from flask import Response, current_app, g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+    push_to_gateway, start_http_server
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Endpoints are Flask endpoint names (notes.get_note), never raw paths, so label sets stay small
+HTTP_REQUESTS = Counter(
+    'http_requests_total', 'HTTP requests served',
+    ['method', 'endpoint', 'status']
+)
+HTTP_REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency',
+    ['method', 'endpoint'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+HTTP_REQUEST_DB_STATEMENTS = Histogram(
+    'http_request_db_statements', 'SQL statements executed per HTTP request',
+    ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+)
+DB_STATEMENTS = Counter(
+    'db_statements_total', 'SQL statements executed',
+    ['context']
+)
+DB_STATEMENT_SECONDS = Counter(
+    'db_statement_seconds_total', 'Time spent executing SQL statements',
+    ['context']
+)
+GEMINI_CALLS = Counter(
+    'gemini_calls_total', 'Gemini calls by outcome (success, error, timeout, circuit_open, overloaded)',
+    ['outcome']
+)
+GEMINI_CALL_DURATION = Histogram(
+    'gemini_call_duration_seconds', 'Gemini call latency, including time queued for the executor',
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30)
+)
+GEMINI_FALLBACKS = Counter(
+    'gemini_fallbacks_total', 'Generic content or lenient validation served instead of a Gemini response',
+    ['operation']
+)
+NOTES_AUTO_ARCHIVED = Counter(
+    'notes_auto_archived_total', 'Expired notes archived, by what archived them',
+    ['source']
+)
+
+def _context():
+    """Label for work outside a request (CLI commands, background workers) or the request's endpoint"""
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return 'background'
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started_at', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['metrics_started_at'].pop()
+    label = _context()
+    DB_STATEMENTS.labels(label).inc()
+    DB_STATEMENT_SECONDS.labels(label).inc(time.perf_counter() - started)
+    if label != 'background':
+        g.metrics_db_statements = g.get('metrics_db_statements', 0) + 1
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    started = exception_context.connection.info.get('metrics_started_at') if exception_context.connection else None
+    if started:
+        started.pop()
+
+def _start_timer():
+    g.metrics_started_at = time.perf_counter()
+
+def _record_request(response):
+    started = g.pop('metrics_started_at', None)
+    if started is None:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    HTTP_REQUESTS.labels(request.method, endpoint, response.status_code).inc()
+    HTTP_REQUEST_DURATION.labels(request.method, endpoint).observe(time.perf_counter() - started)
+    HTTP_REQUEST_DB_STATEMENTS.labels(endpoint).observe(g.pop('metrics_db_statements', 0))
+    return response
+
+def _process_registry():
+    """The registry holding this process's samples (all workers' when they share a multiprocess dir)"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+def _from_allowed_network():
+    """Whether an unauthenticated scrape comes straight from METRICS_ALLOWED_NETWORKS"""
+    # Behind a reverse proxy remote_addr is the proxy's, which says nothing about the real client
+    if 'X-Forwarded-For' in request.headers or 'Forwarded' in request.headers:
+        return False
+    try:
+        address = ipaddress.ip_address(request.remote_addr or '')
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network.strip(), strict=False)
+        for network in current_app.config['METRICS_ALLOWED_NETWORKS'].split(',') if network.strip()
+    )
+
+def metrics_view():
+    """Prometheus text exposition of every worker's samples"""
+    token = current_app.config['METRICS_AUTH_TOKEN']
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    elif not _from_allowed_network():
+        return Response('Forbidden\n', status=403, mimetype='text/plain')
+
+    return Response(generate_latest(_process_registry()), mimetype=CONTENT_TYPE_LATEST)
+
+def start_metrics_server(app, port):
+    """Serve a background process's metrics on their own port; returns the port, or None when disabled.
+
+    The exporter has no authentication, so it binds to METRICS_BIND_ADDRESS
+    (loopback by default).
+    """
+    if not app.config['METRICS_ENABLED'] or not port:
+        return None
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        # Samples went to files in the shared dir; don't leave this process's behind for live gauges
+        atexit.register(multiprocess.mark_process_dead, os.getpid())
+    start_http_server(port, addr=app.config['METRICS_BIND_ADDRESS'], registry=_process_registry())
+    logger.info("Metrics exporter started", extra={'port': port, 'bind_address': app.config['METRICS_BIND_ADDRESS']})
+    return port
+
+def push_metrics(app, job):
+    """Push a one-shot command's samples to METRICS_PUSHGATEWAY_URL, if configured"""
+    gateway = app.config['METRICS_PUSHGATEWAY_URL']
+    if not app.config['METRICS_ENABLED'] or not gateway:
+        return False
+    try:
+        push_to_gateway(gateway, job=job, registry=_process_registry())
+    except Exception as e:
+        logger.warning("Pushing metrics failed", extra={'job': job, 'error': str(e)})
+        return False
+    return True
+
+def init_metrics(app):
+    """Install the request hooks, the SQL event hooks and the /metrics route"""
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view, methods=['GET'])
+
+    # Listening on the Engine class covers the primary and the replica engine alike
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
@@ -1,6 +1,11 @@
-from . import db, bcrypt
+from . import db
+from .password_hasher import password_hasher
 from datetime import datetime, timedelta
 from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from collections import Counter, defaultdict
 import enum
 
 class NoteStatus(enum.Enum):
@@ -8,6 +13,17 @@ class NoteStatus(enum.Enum):
     ARCHIVED = "archived"
     REVIVED = "revived"
 
+class EnrichmentStatus(enum.Enum):
+    NONE = "none"
+    PENDING = "pending"
+    READY = "ready"
+    FAILED = "failed"
+
+class JobStatus(enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    FAILED = "failed"
+
 # Inherit from UserMixin to integrate with Flask-Login
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -18,14 +34,22 @@ class User(db.Model, UserMixin):
     
     # New field for email verification status
     is_verified = db.Column(db.Boolean, nullable=False, default=False)
+    
+    # Bumped on every write to this user's notes; drives ETag / Last-Modified on note reads
+    notes_version = db.Column(db.Integer, nullable=False, default=0)
+    notes_updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
     def set_password(self, password):
-        """Hashes the password using Bcrypt."""
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        """Hashes the password using Bcrypt (in the password hasher's process pool)."""
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
         """Checks the password against the stored Bcrypt hash."""
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return password_hasher.check(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """True if the stored hash uses a lower work factor than BCRYPT_LOG_ROUNDS."""
+        return password_hasher.needs_rehash(self.password_hash)
     
     def __repr__(self):
         return f'<User {self.username}>'
@@ -40,6 +64,7 @@ class Note(db.Model):
     decay_minutes = db.Column(db.Integer, nullable=False, default=1440)  # 24 hours default
     original_decay_minutes = db.Column(db.Integer, nullable=False, default=1440)  # Store original decay time
     last_revised = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)  # last_revised + decay_minutes, kept in sync for indexed expiry checks
     status = db.Column(db.Enum(NoteStatus), default=NoteStatus.ACTIVE, nullable=False)
     
     # Penalty tracking fields
@@ -49,6 +74,7 @@ class Note(db.Model):
     # AI revision fields
     ai_summary = db.Column(db.Text)
     ai_questions = db.Column(db.JSON)  # Store array of questions
+    enrichment_status = db.Column(db.Enum(EnrichmentStatus), default=EnrichmentStatus.NONE, nullable=False)
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -58,9 +84,26 @@ class Note(db.Model):
     # Relationship
     user = db.relationship('User', backref=db.backref('notes', lazy=True))
     
-    @property
-    def expires_at(self):
-        return self.last_revised + timedelta(minutes=self.decay_minutes)
+    __table_args__ = (
+        # Lets the per-user expiry check run as a single index range scan
+        db.Index('ix_note_user_status_expires_at', 'user_id', 'status', 'expires_at'),
+        # Lets the background archiver find upcoming expiries across all users
+        db.Index('ix_note_status_expires_at', 'status', 'expires_at'),
+        # Match the keyset orderings of the active and archived list endpoints
+        db.Index('ix_note_user_status_last_revised', 'user_id', 'status', 'last_revised', 'id'),
+        db.Index('ix_note_user_status_archived_at', 'user_id', 'status', 'archived_at', 'id'),
+    )
+    
+    def __init__(self, **kwargs):
+        kwargs.setdefault('last_revised', datetime.utcnow())
+        kwargs.setdefault('decay_minutes', 1440)
+        kwargs.setdefault('status', NoteStatus.ACTIVE)  # Set up front so note stats can count it before insert
+        super().__init__(**kwargs)
+        self.refresh_expiry()
+    
+    def refresh_expiry(self):
+        """Recompute the stored expiry from last_revised and decay_minutes"""
+        self.expires_at = self.last_revised + timedelta(minutes=self.decay_minutes)
     
     @property
     def is_expired(self):
@@ -84,6 +127,7 @@ class Note(db.Model):
         self.wrong_answers_count = 0
         self.penalty_applied = False
         self.decay_minutes = self.original_decay_minutes
+        self.refresh_expiry()
     
     def apply_wrong_answer_penalty(self):
         """Apply penalty for wrong answer - reduce decay time proportionally"""
@@ -96,6 +140,7 @@ class Note(db.Model):
         # Minimum decay time should be at least 30 minutes
         self.decay_minutes = max(new_decay_minutes, 30)
         self.penalty_applied = True
+        self.refresh_expiry()
         
         return {
             'wrong_answers_count': self.wrong_answers_count,
@@ -109,33 +154,277 @@ class Note(db.Model):
         self.wrong_answers_count = 0
         self.penalty_applied = False
         self.decay_minutes = self.original_decay_minutes
+        self.refresh_expiry()
     
     def touch(self):
         """Update last_revised to current time"""
         self.last_revised = datetime.utcnow()
+        self.refresh_expiry()
     
-    def to_dict(self):
-        penalty_percentage = 0
+    def to_dict(self, fields=None):
+        """Serialize the note; fields limits the output to those keys (all by default)"""
+        serializers = {
+            'id': lambda: self.id,
+            'title': lambda: self.title,
+            'content': lambda: self.content,
+            'decay_minutes': lambda: self.decay_minutes,
+            'original_decay_minutes': lambda: self.original_decay_minutes,
+            'last_revised': lambda: self.last_revised.isoformat(),
+            'status': lambda: self.status.value,
+            'expires_at': lambda: self.expires_at.isoformat(),
+            'time_remaining_seconds': lambda: int(self.time_remaining.total_seconds()),
+            'is_expired': lambda: self.is_expired,
+            'ai_summary': lambda: self.ai_summary,
+            'ai_questions': lambda: self.ai_questions,
+            'enrichment_status': lambda: self.enrichment_status.value if self.enrichment_status else EnrichmentStatus.NONE.value,
+            'wrong_answers_count': lambda: self.wrong_answers_count,
+            'penalty_applied': lambda: self.penalty_applied,
+            'penalty_percentage': self._penalty_percentage,
+            'created_at': lambda: self.created_at.isoformat() if self.created_at else None,
+            'archived_at': lambda: self.archived_at.isoformat() if self.archived_at else None,
+            'revived_at': lambda: self.revived_at.isoformat() if self.revived_at else None
+        }
+        return {field: serializers[field]() for field in (fields or serializers)}
+    
+    def _penalty_percentage(self):
         if self.penalty_applied and self.original_decay_minutes > 0:
-            penalty_percentage = round(((self.original_decay_minutes - self.decay_minutes) / self.original_decay_minutes) * 100, 1)
-        
+            return round(((self.original_decay_minutes - self.decay_minutes) / self.original_decay_minutes) * 100, 1)
+        return 0
+
+# Columns each to_dict() field reads, so list queries can load_only() what the client asked for
+NOTE_FIELD_COLUMNS = {
+    'id': ['id'],
+    'title': ['title'],
+    'content': ['content'],
+    'decay_minutes': ['decay_minutes'],
+    'original_decay_minutes': ['original_decay_minutes'],
+    'last_revised': ['last_revised'],
+    'status': ['status'],
+    'expires_at': ['expires_at'],
+    'time_remaining_seconds': ['expires_at'],
+    'is_expired': ['expires_at'],
+    'ai_summary': ['ai_summary'],
+    'ai_questions': ['ai_questions'],
+    'enrichment_status': ['enrichment_status'],
+    'wrong_answers_count': ['wrong_answers_count'],
+    'penalty_applied': ['penalty_applied'],
+    'penalty_percentage': ['penalty_applied', 'original_decay_minutes', 'decay_minutes'],
+    'created_at': ['created_at'],
+    'archived_at': ['archived_at'],
+    'revived_at': ['revived_at']
+}
+
+# Named field sets for ?fields=; "summary" leaves out the large text and JSON columns
+NOTE_FIELD_VIEWS = {
+    'full': list(NOTE_FIELD_COLUMNS),
+    'summary': [
+        field for field in NOTE_FIELD_COLUMNS
+        if field not in ('content', 'ai_summary', 'ai_questions')
+    ]
+}
+
+class EnrichmentJob(db.Model):
+    """Queued request to fill in a note's AI summary and questions"""
+    id = db.Column(db.Integer, primary_key=True)
+    note_id = db.Column(db.Integer, db.ForeignKey('note.id'), nullable=False, index=True)
+    status = db.Column(db.Enum(JobStatus), default=JobStatus.PENDING, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # Next attempt, or lease expiry while running
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationship
+    note = db.relationship('Note', backref=db.backref('enrichment_jobs', lazy=True, cascade='all, delete-orphan'))
+    
+    __table_args__ = (
+        db.Index('ix_enrichment_job_status_run_after', 'status', 'run_after'),
+    )
+
+class OutboxEmail(db.Model):
+    """Email waiting for the delivery worker; deleted once sent"""
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    html_body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.Enum(JobStatus), default=JobStatus.PENDING, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # Next attempt, or lease expiry while sending
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_outbox_email_status_run_after', 'status', 'run_after'),
+    )
+
+class AICacheEntry(db.Model):
+    """Persistent tier of the generated summary/questions cache"""
+    key = db.Column(db.String(64), primary_key=True)  # sha256 of prompt version, title and content
+    payload = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+class NoteEvent(db.Model):
+    """A note change pushed to the owner's event streams.
+    
+    Written in the same transaction as the change, then relayed to open
+    streams by every web worker (see events.py) and replayable by id.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    note_id = db.Column(db.Integer, nullable=False)  # No FK: the note may since have been deleted
+    event_type = db.Column(db.String(32), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    __table_args__ = (
+        # Replay after a reconnect: this user's events after Last-Event-ID
+        db.Index('ix_note_event_user_id_id', 'user_id', 'id'),
+    )
+
+NOTE_EVENT_FIELDS = ['id', 'title', 'status', 'expires_at', 'enrichment_status']
+
+# Row in note_stats that holds the totals across all users
+GLOBAL_STATS_USER_ID = 0
+
+STATUS_COUNT_COLUMNS = {
+    NoteStatus.ACTIVE: 'active_notes',
+    NoteStatus.ARCHIVED: 'archived_notes',
+    NoteStatus.REVIVED: 'revived_notes'
+}
+
+class NoteStats(db.Model):
+    """Note counts by status for one user (or everyone, at GLOBAL_STATS_USER_ID).
+    
+    Maintained in the same transaction as every status change by
+    update_note_stats; tasks.reconcile_note_stats rebuilds it from a GROUP BY.
+    """
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    active_notes = db.Column(db.Integer, nullable=False, default=0)
+    archived_notes = db.Column(db.Integer, nullable=False, default=0)
+    revived_notes = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        active, archived, revived = self.active_notes or 0, self.archived_notes or 0, self.revived_notes or 0
         return {
-            'id': self.id,
-            'title': self.title,
-            'content': self.content,
-            'decay_minutes': self.decay_minutes,
-            'original_decay_minutes': self.original_decay_minutes,
-            'last_revised': self.last_revised.isoformat(),
-            'status': self.status.value,
-            'expires_at': self.expires_at.isoformat(),
-            'time_remaining_seconds': int(self.time_remaining.total_seconds()),
-            'is_expired': self.is_expired,
-            'ai_summary': self.ai_summary,
-            'ai_questions': self.ai_questions,
-            'wrong_answers_count': self.wrong_answers_count,
-            'penalty_applied': self.penalty_applied,
-            'penalty_percentage': penalty_percentage,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'archived_at': self.archived_at.isoformat() if self.archived_at else None,
-            'revived_at': self.revived_at.isoformat() if self.revived_at else None
-        }
\ No newline at end of file
+            'active_notes': active,
+            'archived_notes': archived,
+            'revived_notes': revived,
+            'total_notes': active + archived + revived
+        }
+
+def _committed_status(note):
+    """Status as last flushed, even if it was changed since"""
+    history = inspect(note).attrs.status.history
+    return history.deleted[0] if history.deleted else note.status
+
+def _apply_stats_delta(session, user_id, delta):
+    """Add delta to a note_stats row, creating it if needed, in one statement"""
+    values = {column: delta.get(column, 0) for column in STATUS_COUNT_COLUMNS.values()}
+    table = NoteStats.__table__
+    dialect = session.get_bind(mapper=inspect(NoteStats)).dialect.name
+    
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        session.execute(
+            insert(table).values(user_id=user_id, **values).on_conflict_do_update(
+                index_elements=[table.c.user_id],
+                set_={column: table.c[column] + amount for column, amount in values.items()}
+            )
+        )
+        return
+    
+    result = session.execute(
+        db.update(table).where(table.c.user_id == user_id)
+        .values({column: table.c[column] + amount for column, amount in values.items()})
+    )
+    if result.rowcount == 0:
+        session.execute(db.insert(table).values(user_id=user_id, **values))
+
+def apply_note_stats_deltas(session, deltas):
+    """Add {user_id: {NoteStatus: change}} to the per-user and global note_stats rows.
+    
+    The flush hook below calls this for ORM changes; bulk Core statements,
+    which skip flush events, must call it themselves.
+    """
+    totals = defaultdict(Counter)
+    for user_id, by_status in deltas.items():
+        for status, amount in by_status.items():
+            totals[int(user_id)][STATUS_COUNT_COLUMNS[status]] += amount
+            totals[GLOBAL_STATS_USER_ID][STATUS_COUNT_COLUMNS[status]] += amount
+    
+    # Lock rows in one fixed order (users ascending, global row last) so concurrent flushes can't deadlock
+    for user_id in sorted(totals, key=lambda user_id: (user_id == GLOBAL_STATS_USER_ID, user_id)):
+        delta = totals[user_id]
+        if any(delta.values()):
+            _apply_stats_delta(session, user_id, delta)
+
+def bump_notes_versions(session, user_ids):
+    """Move notes_version on for users whose notes changed outside an ORM flush"""
+    user_ids = {int(user_id) for user_id in user_ids if user_id is not None}
+    if user_ids:
+        session.execute(
+            db.update(User)
+            .where(User.id.in_(user_ids))
+            .values(notes_version=User.notes_version + 1, notes_updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+
+@event.listens_for(Session, 'before_flush')
+def update_note_stats(session, flush_context, instances):
+    """Keep note_stats in step with notes being created, deleted or changing status"""
+    deltas = defaultdict(Counter)
+    
+    def shift(note, status, amount):
+        if status in STATUS_COUNT_COLUMNS and note.user_id is not None:
+            deltas[note.user_id][status] += amount
+    
+    for note in session.new:
+        if isinstance(note, Note):
+            shift(note, note.status, 1)
+    for note in session.deleted:
+        if isinstance(note, Note):
+            shift(note, _committed_status(note), -1)
+    for note in session.dirty:
+        if isinstance(note, Note):
+            history = inspect(note).attrs.status.history
+            if history.added and history.deleted and history.added[0] != history.deleted[0]:
+                shift(note, history.deleted[0], -1)
+                shift(note, history.added[0], 1)
+    
+    apply_note_stats_deltas(session, deltas)
+
+@event.listens_for(Session, 'before_flush')
+def bump_notes_version(session, flush_context, instances):
+    """Bump notes_version for every user whose notes are created, changed or deleted in this flush"""
+    user_ids = {note.user_id for note in session.new if isinstance(note, Note)}
+    user_ids |= {note.user_id for note in session.deleted if isinstance(note, Note)}
+    user_ids |= {
+        note.user_id for note in session.dirty
+        if isinstance(note, Note) and session.is_modified(note, include_collections=False)
+    }
+    bump_notes_versions(session, user_ids)
+
+@event.listens_for(Session, 'before_flush')
+def record_note_events(session, flush_context, instances):
+    """Queue note.archived / note.revived / note.enriched events for status changes in this flush"""
+    for note in list(session.dirty):
+        if not isinstance(note, Note) or note.user_id is None:
+            continue
+        
+        state = inspect(note)
+        event_types = []
+        status_added = state.attrs.status.history.added
+        if status_added and status_added[0] == NoteStatus.ARCHIVED:
+            event_types.append('note.archived')
+        elif status_added and status_added[0] == NoteStatus.REVIVED:
+            event_types.append('note.revived')
+        enrichment_added = state.attrs.enrichment_status.history.added
+        if enrichment_added and enrichment_added[0] == EnrichmentStatus.READY:
+            event_types.append('note.enriched')
+        
+        for event_type in event_types:
+            session.add(NoteEvent(
+                user_id=int(note.user_id),
+                note_id=note.id,
+                event_type=event_type,
+                payload=note.to_dict(NOTE_EVENT_FIELDS)
+            ))
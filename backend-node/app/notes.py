@@ -1,67 +1,208 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app, make_response, stream_with_context, g
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from .models import Note, NoteStatus
+from .models import (
+    User, Note, NoteStats, NoteStatus, EnrichmentStatus, EnrichmentJob, NOTE_FIELD_COLUMNS, NOTE_FIELD_VIEWS,
+    apply_note_stats_deltas, bump_notes_versions
+)
 from .ai_service import gemini_service
+from .ai_cache import summary_cache, validation_cache
+from .enrichment import enqueue_enrichment
+from .touch_buffer import touch_buffer
+from .db_routing import replica_configured
+from .events import (
+    event_broker, format_sse, replay_events, issue_stream_token, load_stream_token,
+    STREAM_OVERFLOW, TooManyStreamsError, StreamsFullError
+)
+from .metrics import NOTES_AUTO_ARCHIVED
 from . import db
-from datetime import datetime
-from sqlalchemy import or_
+from datetime import datetime, timedelta
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import load_only, selectinload
+from functools import wraps
+import base64
+import json
+import logging
+import queue
+import time
+import zlib
 
 notes_bp = Blueprint('notes', __name__)
+logger = logging.getLogger(__name__)
+
+def encode_cursor(sort_value, note_id):
+    """Opaque cursor for the position just after (sort_value, note_id)"""
+    raw = json.dumps([sort_value.isoformat(), note_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for anything malformed"""
+    try:
+        sort_value, note_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(sort_value), int(note_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def conditional_response(user_id, build_response):
+    """Tag a read with the user's notes_version, answering 304 when the client already has it.
+    
+    The version lookup reads only the user row, so an unchanged collection
+    is confirmed without querying the notes table at all. Touches still
+    waiting in this process's touch buffer haven't bumped the version yet,
+    so the latest one is part of the tag too.
+    """
+    version, updated_at = db.session.query(
+        User.notes_version, User.notes_updated_at
+    ).filter_by(id=user_id).one()
+    etag = f'u{user_id}-v{version}'
+    touched_at = touch_buffer.pending_user_touch(int(user_id))
+    if touched_at is not None:
+        etag += f'-t{int(touched_at.timestamp() * 1000000)}'
+        updated_at = max(updated_at, touched_at)
+    
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(build_response())
+    
+    response.set_etag(etag, weak=True)
+    response.last_modified = updated_at
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def read_replica(view):
+    """Serve a read-only view from the read replica, if one is configured.
+    
+    Users who changed their notes within READ_YOUR_WRITES_SECONDS stay on the
+    primary so they see their own writes; that check is a primary-key read of
+    notes_updated_at on the primary, shared by every worker.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if replica_configured():
+            last_write = db.session.query(User.notes_updated_at).filter_by(id=get_jwt_identity()).scalar()
+            window = timedelta(seconds=current_app.config['READ_YOUR_WRITES_SECONDS'])
+            g.use_read_replica = last_write is None or datetime.utcnow() - last_write > window
+        return view(*args, **kwargs)
+    return wrapper
+
+def parse_page_args():
+    """Read limit and cursor from the query string"""
+    limit = request.args.get('limit', current_app.config['NOTES_PAGE_DEFAULT_LIMIT'], type=int)
+    limit = max(1, min(limit, current_app.config['NOTES_PAGE_MAX_LIMIT']))
+    cursor = request.args.get('cursor')
+    return limit, decode_cursor(cursor) if cursor else None
+
+def parse_fields_arg(default_view):
+    """Resolve ?fields= (a view name or comma-separated field list) to to_dict() keys"""
+    spec = request.args.get('fields', default_view)
+    if spec in NOTE_FIELD_VIEWS:
+        return NOTE_FIELD_VIEWS[spec]
+    
+    fields = [field.strip() for field in spec.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in NOTE_FIELD_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
+def load_note_fields(query, fields, sort_column):
+    """Only pull the columns the requested fields need (plus the sort key for the cursor)"""
+    columns = {column for field in fields for column in NOTE_FIELD_COLUMNS[field]}
+    columns.add(sort_column.key)
+    return query.options(load_only(*(getattr(Note, column) for column in columns)))
+
+def paginate_notes(query, sort_column, limit, cursor):
+    """Keyset-paginate newest first on (sort_column, id); returns (notes, next_cursor)"""
+    if cursor:
+        sort_value, note_id = cursor
+        query = query.filter(or_(
+            sort_column < sort_value,
+            and_(sort_column == sort_value, Note.id < note_id)
+        ))
+    
+    # The cursor is built from the stored value the rows were ordered by; the loaded
+    # instance may show a newer, still-buffered touch, which would skip or repeat rows
+    rows = query.add_columns(sort_column.label('page_sort_value')).order_by(
+        sort_column.desc(), Note.id.desc()
+    ).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last, sort_value = rows[-1]
+        next_cursor = encode_cursor(sort_value, last.id)
+    
+    return [note for note, _ in rows], next_cursor
+
+def release_db_connection():
+    """End the current transaction so its pooled connection isn't held through a slow AI call.
+    
+    Loaded notes are expired and reload (one SELECT) the next time they are used.
+    """
+    db.session.commit()
 
 def auto_archive_expired_notes(user_id):
     """Automatically archive expired notes for a user"""
     try:
-        expired_notes = Note.query.filter_by(
-            user_id=user_id, 
-            status=NoteStatus.ACTIVE
+        # Only the rows that have actually expired, via the (user_id, status, expires_at) index
+        expired_notes = Note.query.filter(
+            Note.user_id == user_id,
+            Note.status == NoteStatus.ACTIVE,
+            Note.expires_at <= datetime.utcnow()
         ).all()
         
-        archived_count = 0
+        archived_ids = []
         for note in expired_notes:
-            if note.is_expired:
-                # Generate AI content before archiving if not present
-                if not note.ai_summary or not note.ai_questions:
-                    try:
-                        ai_result = gemini_service.generate_summary_and_questions(
-                            note.title, note.content
-                        )
-                        note.ai_summary = ai_result['summary']
-                        note.ai_questions = ai_result['questions']
-                    except Exception as e:
-                        print(f"⚠️ Failed to generate AI content for note {note.id}: {e}")
-                        pass  # Continue even if AI fails
-                
-                note.archive()
-                archived_count += 1
-                print(f"📦 Auto-archived expired note: {note.title}")
+            note.archive()
+            archived_ids.append(note.id)
+        archived_count = len(archived_ids)
+        
+        # AI summary and questions are filled in later by the enrichment worker
+        enqueue_enrichment(expired_notes)
         
         if archived_count > 0:
             db.session.commit()
-            print(f"✅ Auto-archived {archived_count} expired notes for user {user_id}")
+            NOTES_AUTO_ARCHIVED.labels('request').inc(archived_count)
+            logger.info("Auto-archived expired notes", extra={
+                'user_id': user_id,
+                'archived_count': archived_count,
+                'note_ids': archived_ids
+            })
         
         return archived_count
-    except Exception as e:
-        print(f"❌ Error in auto-archive: {e}")
+    except Exception:
+        logger.exception("Auto-archive failed", extra={'user_id': user_id})
         return 0
 
 @notes_bp.route('/', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_notes():
-    """Get all active notes for user, archive expired ones"""
+    """Get a page of active notes for user, most recently revised first
+    (expired ones are archived by the background archiver)"""
     user_id = get_jwt_identity()
     
-    # Auto-archive expired notes
-    auto_archive_expired_notes(user_id)
+    try:
+        limit, cursor = parse_page_args()
+        fields = parse_fields_arg('summary')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Get all active notes
-    notes = Note.query.filter_by(
+    query = Note.query.filter_by(
         user_id=user_id, 
         status=NoteStatus.ACTIVE
-    ).order_by(Note.last_revised.desc()).all()
+    )
+    query = load_note_fields(query, fields, Note.last_revised)
     
-    return jsonify({
-        'notes': [note.to_dict() for note in notes]
-    }), 200
+    def build_response():
+        notes, next_cursor = paginate_notes(query, Note.last_revised, limit, cursor)
+        return jsonify({
+            'notes': [note.to_dict(fields) for note in notes],
+            'next_cursor': next_cursor
+        }), 200
+    
+    return conditional_response(user_id, build_response)
 
 @notes_bp.route('/', methods=['POST'])
 @jwt_required()
@@ -100,39 +241,182 @@ def create_note():
         'note': note.to_dict()
     }), 201
 
+def read_import_rows():
+    """Yield (row, error) for each note in an NDJSON body or a JSON array body"""
+    if request.mimetype == 'application/x-ndjson':
+        for line in request.stream:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line), None
+            except ValueError:
+                yield None, 'Invalid JSON'
+        return
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        raise ValueError('Expected a JSON array of notes or an application/x-ndjson body')
+    for row in data:
+        yield row, None
+
+def validate_import_row(row):
+    """Check one imported note and return its column values; raises ValueError"""
+    if not isinstance(row, dict):
+        raise ValueError('Each note must be a JSON object')
+    
+    title = row.get('title')
+    content = row.get('content')
+    if not isinstance(title, str) or not isinstance(content, str) or not title.strip() or not content.strip():
+        raise ValueError('Title and content are required')
+    
+    decay_minutes = row.get('decay_minutes', current_app.config['DEFAULT_DECAY_MINUTES'])
+    if not isinstance(decay_minutes, int) or isinstance(decay_minutes, bool):
+        raise ValueError('decay_minutes must be an integer')
+    if not current_app.config['MIN_DECAY_MINUTES'] <= decay_minutes <= current_app.config['MAX_DECAY_MINUTES']:
+        raise ValueError(
+            f"Decay time must be between {current_app.config['MIN_DECAY_MINUTES']} and "
+            f"{current_app.config['MAX_DECAY_MINUTES']} minutes"
+        )
+    
+    ai_summary = row.get('ai_summary')
+    ai_questions = row.get('ai_questions')
+    if ai_summary is not None and not isinstance(ai_summary, str):
+        raise ValueError('ai_summary must be a string')
+    if ai_questions is not None and not (
+        isinstance(ai_questions, list) and all(isinstance(question, str) for question in ai_questions)
+    ):
+        raise ValueError('ai_questions must be a list of strings')
+    
+    return {
+        'title': title.strip(),
+        'content': content.strip(),
+        'decay_minutes': decay_minutes,
+        'original_decay_minutes': decay_minutes,
+        'ai_summary': ai_summary,
+        'ai_questions': ai_questions
+    }
+
+def insert_note_batch(user_id, batch, enrich):
+    """INSERT one batch of validated rows in a single executemany and return their ids.
+    
+    Core inserts skip the flush hooks, so note_stats and notes_version are
+    updated here, in the same transaction.
+    """
+    now = datetime.utcnow()
+    rows = []
+    for values in batch:
+        if values['ai_summary'] and values['ai_questions']:
+            enrichment_status = EnrichmentStatus.READY  # Imported with its AI content
+        elif enrich:
+            enrichment_status = EnrichmentStatus.PENDING
+        else:
+            enrichment_status = EnrichmentStatus.NONE
+        rows.append({
+            **values,
+            'user_id': user_id,
+            'status': NoteStatus.ACTIVE,
+            'enrichment_status': enrichment_status,
+            'last_revised': now,
+            'expires_at': now + timedelta(minutes=values['decay_minutes']),
+            'created_at': now
+        })
+    
+    note_ids = db.session.scalars(
+        db.insert(Note).returning(Note.id, sort_by_parameter_order=True), rows
+    ).all()
+    
+    jobs = [
+        {'note_id': note_id} for note_id, row in zip(note_ids, rows)
+        if row['enrichment_status'] == EnrichmentStatus.PENDING
+    ]
+    if jobs:
+        db.session.execute(db.insert(EnrichmentJob), jobs)
+    
+    apply_note_stats_deltas(db.session, {user_id: {NoteStatus.ACTIVE: len(note_ids)}})
+    bump_notes_versions(db.session, [user_id])
+    db.session.commit()
+    return note_ids
+
+@notes_bp.route('/import', methods=['POST'])
+@jwt_required()
+def import_notes():
+    """Create many notes from an NDJSON or JSON array body, reporting a result per row"""
+    user_id = int(get_jwt_identity())
+    batch_size = current_app.config['NOTES_IMPORT_BATCH_SIZE']
+    max_rows = current_app.config['NOTES_IMPORT_MAX_ROWS']
+    enrich = request.args.get('enrich', str(current_app.config['NOTES_IMPORT_ENQUEUE_ENRICHMENT'])).lower() in ['true', 'on', '1']
+    
+    results = []
+    batch, batch_indexes = [], []
+    
+    def flush_batch():
+        note_ids = insert_note_batch(user_id, batch, enrich)
+        for index, note_id in zip(batch_indexes, note_ids):
+            results[index] = {'index': index, 'status': 'created', 'id': note_id}
+        batch.clear()
+        batch_indexes.clear()
+    
+    try:
+        for index, (row, error) in enumerate(read_import_rows()):
+            if index >= max_rows:
+                # Stop reading here, so an oversized upload costs neither memory nor a result per extra row
+                results.append({
+                    'index': index,
+                    'status': 'truncated',
+                    'error': f'Import is limited to {max_rows} notes per request; this row and any after it were not imported'
+                })
+                break
+            if not error:
+                try:
+                    batch.append(validate_import_row(row))
+                    batch_indexes.append(index)
+                    results.append(None)  # Filled in once the batch is inserted
+                except ValueError as e:
+                    error = str(e)
+            if error:
+                results.append({'index': index, 'status': 'error', 'error': error})
+            
+            if len(batch) >= batch_size:
+                flush_batch()
+        
+        if batch:
+            flush_batch()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    created = sum(1 for result in results if result['status'] == 'created')
+    logger.info("Imported notes", extra={'user_id': user_id, 'created_count': created, 'rows': len(results)})
+    
+    return jsonify({
+        'created': created,
+        'failed': len(results) - created,
+        'results': results
+    }), 207 if created < len(results) else 201
+
 @notes_bp.route('/<int:note_id>', methods=['GET'])
 @jwt_required()
 def get_note(note_id):
     """Get specific note and update last_revised (touching the note)"""
     user_id = get_jwt_identity()
     
-    # Auto-archive expired notes first
-    auto_archive_expired_notes(user_id)
-    
     note = Note.query.filter_by(id=note_id, user_id=user_id).first()
     if not note:
         return jsonify({'error': 'Note not found'}), 404
     
-    # If note is active and not expired, touch it
+    # If note is active and not expired, touch it; the write is coalesced with other reads
     if note.status == NoteStatus.ACTIVE and not note.is_expired:
-        note.touch()
-        db.session.commit()
+        touch_buffer.touch(current_app._get_current_object(), note)
     
-    return jsonify({'note': note.to_dict()}), 200
+    return conditional_response(user_id, lambda: (jsonify({'note': note.to_dict()}), 200))
 
-@notes_bp.route('/<int:note_id>', methods=['PUT'])
-@jwt_required()
-def update_note(note_id):
-    """Update note content and refresh timer"""
-    user_id = get_jwt_identity()
-    data = request.get_json()
+def apply_note_update(note, data):
+    """Apply title/content/decay changes from data to a note and refresh its timer.
     
-    note = Note.query.filter_by(id=note_id, user_id=user_id).first()
-    if not note:
-        return jsonify({'error': 'Note not found'}), 404
-    
-    if note.status == NoteStatus.ARCHIVED:
-        return jsonify({'error': 'Cannot edit archived note. Revive it first.'}), 400
+    Returns the old (title, content) when the text may have changed, so the
+    caller can drop its cached AI content; generated content for the old text
+    will never be asked for again.
+    """
+    stale_text = (note.title, note.content) if 'title' in data or 'content' in data else None
     
     # Update fields
     if 'title' in data:
@@ -149,7 +433,25 @@ def update_note(note_id):
     
     # Touch the note (reset timer)
     note.touch()
+    return stale_text
+
+@notes_bp.route('/<int:note_id>', methods=['PUT'])
+@jwt_required()
+def update_note(note_id):
+    """Update note content and refresh timer"""
+    user_id = get_jwt_identity()
+    data = request.get_json()
     
+    note = Note.query.filter_by(id=note_id, user_id=user_id).first()
+    if not note:
+        return jsonify({'error': 'Note not found'}), 404
+    
+    if note.status == NoteStatus.ARCHIVED:
+        return jsonify({'error': 'Cannot edit archived note. Revive it first.'}), 400
+    
+    stale_text = apply_note_update(note, data)
+    if stale_text:
+        summary_cache.invalidate_many([stale_text], db.session)
     db.session.commit()
     
     return jsonify({
@@ -171,11 +473,14 @@ def get_ai_revision(note_id):
         return jsonify({'error': 'Cannot revise archived note. Try to revive it first.'}), 400
     
     # Generate AI content
-    ai_result = gemini_service.generate_summary_and_questions(note.title, note.content)
+    title, content = note.title, note.content
+    release_db_connection()
+    ai_result = gemini_service.generate_summary_and_questions(title, content)
     
     # Store AI content in note
     note.ai_summary = ai_result['summary']
     note.ai_questions = ai_result['questions']
+    note.enrichment_status = EnrichmentStatus.READY
     
     # Touch the note (engaging with it extends timer)
     note.touch()
@@ -216,7 +521,9 @@ def answer_revision_question(note_id):
     question = note.ai_questions[question_index]
     
     # Validate answer with AI
-    is_valid = gemini_service.validate_answer(question, user_answer, note.content)
+    content = note.content
+    release_db_connection()
+    is_valid = gemini_service.validate_answer(question, user_answer, content)
     
     if is_valid:
         # Correct answer - touch the note to extend timer
@@ -244,18 +551,31 @@ def answer_revision_question(note_id):
 
 @notes_bp.route('/archived', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_archived_notes():
-    """Get all archived notes"""
+    """Get a page of archived notes, most recently archived first"""
     user_id = get_jwt_identity()
     
-    notes = Note.query.filter_by(
+    try:
+        limit, cursor = parse_page_args()
+        fields = parse_fields_arg('summary')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = Note.query.filter_by(
         user_id=user_id, 
         status=NoteStatus.ARCHIVED
-    ).order_by(Note.archived_at.desc()).all()
+    )
+    query = load_note_fields(query, fields, Note.archived_at)
     
-    return jsonify({
-        'archived_notes': [note.to_dict() for note in notes]
-    }), 200
+    def build_response():
+        notes, next_cursor = paginate_notes(query, Note.archived_at, limit, cursor)
+        return jsonify({
+            'archived_notes': [note.to_dict(fields) for note in notes],
+            'next_cursor': next_cursor
+        }), 200
+    
+    return conditional_response(user_id, build_response)
 
 @notes_bp.route('/<int:note_id>/revive', methods=['POST'])
 @jwt_required()
@@ -279,9 +599,12 @@ def revive_note(note_id):
     
     # Generate AI questions if not present
     if not note.ai_questions:
-        ai_result = gemini_service.generate_summary_and_questions(note.title, note.content)
+        title, content = note.title, note.content
+        release_db_connection()
+        ai_result = gemini_service.generate_summary_and_questions(title, content)
         note.ai_summary = ai_result['summary']
         note.ai_questions = ai_result['questions']
+        note.enrichment_status = EnrichmentStatus.READY
         db.session.commit()
     
     if question_index >= len(note.ai_questions):
@@ -290,7 +613,9 @@ def revive_note(note_id):
     question = note.ai_questions[question_index]
     
     # Validate answer with AI
-    is_valid = gemini_service.validate_answer(question, user_answer, note.content)
+    content = note.content
+    release_db_connection()
+    is_valid = gemini_service.validate_answer(question, user_answer, content)
     
     if is_valid:
         # Correct answer - revive the note and reset penalties
@@ -332,24 +657,154 @@ def delete_note(note_id):
 
 @notes_bp.route('/stats', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_stats():
     """Get user's note statistics"""
     user_id = get_jwt_identity()
     
-    # Auto-archive expired notes before calculating stats
-    auto_archive_expired_notes(user_id)
+    def build_response():
+        # One primary-key read of the maintained counters, however many notes there are
+        stats = db.session.get(NoteStats, int(user_id)) or NoteStats(user_id=int(user_id))
+        return jsonify({'stats': stats.to_dict()}), 200
     
-    active_count = Note.query.filter_by(user_id=user_id, status=NoteStatus.ACTIVE).count()
-    archived_count = Note.query.filter_by(user_id=user_id, status=NoteStatus.ARCHIVED).count()
-    revived_count = Note.query.filter_by(user_id=user_id, status=NoteStatus.REVIVED).count()
+    return conditional_response(user_id, build_response)
+
+def stream_ndjson(rows, compress=False):
+    """Encode rows as newline-delimited JSON, buffered into chunks and optionally gzipped"""
+    chunk_bytes = current_app.config['NOTES_EXPORT_CHUNK_BYTES']
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 writes a gzip header
+    
+    def emit(data):
+        # Sync-flush so every chunk reaches the client now instead of waiting in zlib
+        return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH) if compressor else data
+    
+    buffer = []
+    buffered = 0
+    for row in rows:
+        line = json.dumps(row, separators=(',', ':')).encode('utf-8') + b'\n'
+        buffer.append(line)
+        buffered += len(line)
+        if buffered >= chunk_bytes:
+            yield emit(b''.join(buffer))
+            buffer, buffered = [], 0
+    
+    if buffer:
+        yield emit(b''.join(buffer))
+    if compressor:
+        yield compressor.flush()
+
+@notes_bp.route('/export', methods=['GET'])
+@jwt_required()
+@read_replica
+def export_notes():
+    """Stream all of the user's notes as NDJSON (gzipped with ?compress=gzip or Accept-Encoding)"""
+    user_id = get_jwt_identity()
     
+    try:
+        fields = parse_fields_arg('full')
+        status = NoteStatus(request.args['status']) if 'status' in request.args else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    compress = (request.args.get('compress') == 'gzip'
+                or 'gzip' in request.accept_encodings and 'compress' not in request.args)
+    
+    query = db.select(Note).filter_by(user_id=user_id).order_by(Note.id)
+    if status:
+        query = query.filter_by(status=status)
+    columns = {column for field in fields for column in NOTE_FIELD_COLUMNS[field]}
+    query = query.options(load_only(*(getattr(Note, column) for column in columns)))
+    
+    def generate_rows():
+        # yield_per streams from a server-side cursor; the session's identity map only
+        # holds weak references, so rows already written are freed as we go
+        result = db.session.execute(query.execution_options(yield_per=current_app.config['NOTES_EXPORT_YIELD_PER']))
+        for note in result.scalars():
+            yield note.to_dict(fields)
+    
+    response = Response(
+        stream_with_context(stream_ndjson(generate_rows(), compress)),
+        mimetype='application/x-ndjson'
+    )
+    response.headers['Content-Disposition'] = 'attachment; filename="notes.ndjson' + ('.gz"' if compress else '"')
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'  # Stop nginx holding the stream back
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+@notes_bp.route('/events/token', methods=['POST'])
+@jwt_required()
+def create_events_token():
+    """Issue a short-lived token for opening an event stream with EventSource"""
     return jsonify({
-        'stats': {
-            'active_notes': active_count,
-            'archived_notes': archived_count,
-            'revived_notes': revived_count,
-            'total_notes': active_count + archived_count + revived_count
-        }
+        'token': issue_stream_token(get_jwt_identity()),
+        'expires_in': current_app.config['EVENTS_TOKEN_SECONDS']
+    }), 200
+
+@notes_bp.route('/events', methods=['GET'])
+@jwt_required(optional=True)
+def note_events():
+    """Server-sent events: note.expiring_soon, note.archived, note.enriched and note.revived
+    
+    Authenticated by the Authorization header or, for EventSource, a ?token=
+    from POST /events/token. Meant to be served by the gevent events server.
+    """
+    identity = get_jwt_identity()
+    user_id = int(identity) if identity is not None else load_stream_token(request.args.get('token', ''))
+    if user_id is None:
+        return jsonify({'error': 'Missing or expired stream token'}), 401
+    app = current_app._get_current_object()
+    
+    # Catch up on anything missed since the client's last connection
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    backlog = replay_events(user_id, last_event_id) if last_event_id is not None else []
+    # The stream itself never touches the database; don't hold a pooled connection open for it
+    db.session.remove()
+    
+    try:
+        subscription = event_broker.subscribe(app, user_id)
+    except TooManyStreamsError as e:
+        return jsonify({'error': str(e)}), 429
+    except StreamsFullError as e:
+        # Fail fast (e.g. /events reached the threaded web server); clients keep polling and retry later
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    
+    heartbeat = app.config['EVENTS_HEARTBEAT_SECONDS']
+    closes_at = time.monotonic() + app.config['EVENTS_STREAM_MAX_SECONDS']
+    
+    def generate():
+        try:
+            yield 'retry: 5000\n\n'
+            for event in backlog:
+                yield format_sse(event)
+            while time.monotonic() < closes_at:
+                try:
+                    event = subscription.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if event is STREAM_OVERFLOW:
+                    return
+                yield format_sse(event)
+        finally:
+            event_broker.unsubscribe(user_id, subscription)
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Stop nginx holding events back
+    return response
+
+@notes_bp.route('/ai-cache/stats', methods=['GET'])
+@jwt_required()
+def get_ai_cache_stats():
+    """Get hit/miss counters for this worker's AI caches"""
+    return jsonify({
+        'ai_cache': summary_cache.stats(),
+        'validation_cache': validation_cache.stats()
     }), 200
 
 @notes_bp.route('/batch-archive', methods=['POST'])
@@ -358,35 +813,146 @@ def batch_archive_expired():
     """Manually trigger archiving of expired notes"""
     user_id = get_jwt_identity()
     
-    expired_notes = Note.query.filter_by(
-        user_id=user_id, 
-        status=NoteStatus.ACTIVE
+    expired_notes = Note.query.filter(
+        Note.user_id == user_id,
+        Note.status == NoteStatus.ACTIVE,
+        Note.expires_at <= datetime.utcnow()
     ).all()
     
     archived_count = 0
     for note in expired_notes:
-        if note.is_expired:
-            # Generate AI content before archiving if not present
-            if not note.ai_summary or not note.ai_questions:
-                try:
-                    ai_result = gemini_service.generate_summary_and_questions(
-                        note.title, note.content
-                    )
-                    note.ai_summary = ai_result['summary']
-                    note.ai_questions = ai_result['questions']
-                except Exception as e:
-                    pass  # Continue even if AI fails
-            
-            note.archive()
-            archived_count += 1
+        note.archive()
+        archived_count += 1
+    
+    # AI summary and questions are filled in later by the enrichment worker
+    enqueue_enrichment(expired_notes)
     
     db.session.commit()
+    NOTES_AUTO_ARCHIVED.labels('manual').inc(archived_count)
     
     return jsonify({
         'message': f'Archived {archived_count} expired notes',
         'archived_count': archived_count
     }), 200
 
+BATCH_OPERATIONS = ('touch', 'update', 'reset_penalties', 'archive', 'delete')
+
+def validate_batch_operations(operations):
+    """Check the shape of a batch request; raises ValueError"""
+    if not isinstance(operations, list) or not operations:
+        raise ValueError('operations must be a non-empty list')
+    
+    total_ids = 0
+    for operation in operations:
+        if not isinstance(operation, dict) or operation.get('op') not in BATCH_OPERATIONS:
+            raise ValueError(f"Each operation needs an op, one of: {', '.join(BATCH_OPERATIONS)}")
+        ids = operation.get('ids')
+        if not isinstance(ids, list) or not all(isinstance(note_id, int) and not isinstance(note_id, bool) for note_id in ids):
+            raise ValueError('Each operation needs ids, a list of note ids')
+        total_ids += len(ids)
+        
+        if operation['op'] == 'update':
+            changes = operation.get('changes')
+            if not isinstance(changes, dict) or not changes.keys() & {'title', 'content', 'decay_minutes'}:
+                raise ValueError('update needs changes with title, content or decay_minutes')
+            for field in ('title', 'content'):
+                if field in changes and (not isinstance(changes[field], str) or not changes[field].strip()):
+                    raise ValueError(f'{field} must be a non-empty string')
+            if 'decay_minutes' in changes and not (
+                isinstance(changes['decay_minutes'], int)
+                and current_app.config['MIN_DECAY_MINUTES'] <= changes['decay_minutes'] <= current_app.config['MAX_DECAY_MINUTES']
+            ):
+                raise ValueError(
+                    f"Decay time must be between {current_app.config['MIN_DECAY_MINUTES']} and "
+                    f"{current_app.config['MAX_DECAY_MINUTES']} minutes"
+                )
+    
+    if total_ids > current_app.config['NOTES_BATCH_MAX_IDS']:
+        raise ValueError(f"A batch may reference at most {current_app.config['NOTES_BATCH_MAX_IDS']} note ids")
+
+def apply_batch_operation(op, note, operation, stale_texts):
+    """Apply one operation to one owned note; returns an error message or None.
+    
+    Edited notes' old (title, content) are appended to stale_texts.
+    """
+    if op == 'touch':
+        # Same rule as reading a note: only live notes get their timer reset
+        if note.status != NoteStatus.ACTIVE or note.is_expired:
+            return 'Only active, unexpired notes can be touched'
+        note.touch()
+    elif op == 'update':
+        if note.status == NoteStatus.ARCHIVED:
+            return 'Cannot edit archived note. Revive it first.'
+        stale_text = apply_note_update(note, operation['changes'])
+        if stale_text:
+            stale_texts.append(stale_text)
+    elif op == 'reset_penalties':
+        note.reset_penalties()
+    elif op == 'archive':
+        if note.status == NoteStatus.ARCHIVED:
+            return 'Note is already archived'
+        note.archive()
+        # AI summary and questions are filled in later by the enrichment worker
+        enqueue_enrichment([note])
+    elif op == 'delete':
+        db.session.delete(note)
+    return None
+
+@notes_bp.route('/batch', methods=['POST'])
+@jwt_required()
+def batch_mutate_notes():
+    """Apply touch/update/reset_penalties/archive/delete operations to many notes with one commit"""
+    user_id = get_jwt_identity()
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    
+    try:
+        validate_batch_operations(operations)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Ownership for every id in the request is settled by one IN query
+    note_ids = {note_id for operation in operations for note_id in operation['ids']}
+    query = Note.query.filter(Note.user_id == user_id, Note.id.in_(note_ids))
+    if any(operation['op'] == 'delete' for operation in operations):
+        # Deleting cascades to enrichment jobs; load them together rather than per note
+        query = query.options(selectinload(Note.enrichment_jobs))
+    notes = {note.id: note for note in query.all()}
+    
+    results = []
+    deleted = set()
+    stale_texts = []
+    for operation in operations:
+        op = operation['op']
+        for note_id in operation['ids']:
+            note = notes.get(note_id)
+            if note is None or note_id in deleted:
+                results.append({'op': op, 'id': note_id, 'status': 'error', 'error': 'Note not found'})
+                continue
+            
+            error = apply_batch_operation(op, note, operation, stale_texts)
+            if error:
+                results.append({'op': op, 'id': note_id, 'status': 'error', 'error': error})
+                continue
+            if op == 'delete':
+                deleted.add(note_id)
+            results.append({'op': op, 'id': note_id, 'status': 'ok'})
+    
+    # Serialize before committing so expire_on_commit doesn't reload every note
+    fields = NOTE_FIELD_VIEWS['summary']
+    changed = [note.to_dict(fields) for note_id, note in notes.items() if note_id not in deleted]
+    # One DELETE for every edited note's cached AI content, in the same commit
+    summary_cache.invalidate_many(stale_texts, db.session)
+    db.session.commit()
+    
+    applied = sum(1 for result in results if result['status'] == 'ok')
+    return jsonify({
+        'applied': applied,
+        'failed': len(results) - applied,
+        'results': results,
+        'notes': changed
+    }), 200
+
 @notes_bp.route('/<int:note_id>/reset-penalties', methods=['POST'])
 @jwt_required()
 def reset_note_penalties(note_id):
@@ -410,6 +976,7 @@ def reset_note_penalties(note_id):
 
 @notes_bp.route('/<int:note_id>/penalty-info', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_penalty_info(note_id):
     """Get detailed penalty information for a note"""
     user_id = get_jwt_identity()
@@ -472,6 +1039,7 @@ def complete_revision_session(note_id):
             penalty_percentage = min(0.125 * note.wrong_answers_count, 0.625)
             new_decay_minutes = int(note.original_decay_minutes * (1 - penalty_percentage))
             note.decay_minutes = max(new_decay_minutes, 30)
+            note.refresh_expiry()
         
         bonus_applied = True
     
@@ -0,0 +1,158 @@
+import logging
+import smtplib
+import threading
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from flask_mail import Message
+
+from . import db, mail
+from .models import OutboxEmail, JobStatus
+from .metrics import push_metrics, start_metrics_server
+
+logger = logging.getLogger(__name__)
+
+def queue_email(to, subject, html_body):
+    """Queue an email for the delivery worker.
+
+    The row is added to the caller's session, so it commits atomically with
+    whatever the request did (e.g. creating the user it is addressed to).
+    """
+    email = OutboxEmail(recipient=to, subject=subject, html_body=html_body)
+    db.session.add(email)
+    return email
+
+def claim_emails(limit):
+    """Lease up to limit due emails to this worker (same scheme as enrichment jobs, including the conditional UPDATE)"""
+    now = datetime.utcnow()
+    candidates = db.session.execute(
+        db.select(OutboxEmail.id, OutboxEmail.status, OutboxEmail.run_after).where(
+            OutboxEmail.status.in_([JobStatus.PENDING, JobStatus.RUNNING]),
+            OutboxEmail.run_after <= now
+        ).order_by(OutboxEmail.run_after).limit(limit).with_for_update(skip_locked=True)
+    ).all()
+
+    lease_until = now + timedelta(seconds=current_app.config['EMAIL_OUTBOX_LEASE_SECONDS'])
+    claimed = []
+    for email_id, status, run_after in candidates:
+        result = db.session.execute(
+            db.update(OutboxEmail)
+            .where(OutboxEmail.id == email_id, OutboxEmail.status == status, OutboxEmail.run_after == run_after)
+            .values(status=JobStatus.RUNNING, run_after=lease_until)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            claimed.append(email_id)
+    db.session.commit()
+
+    return claimed
+
+def _backoff(attempts):
+    """Exponential backoff before the next attempt, capped"""
+    base = current_app.config['EMAIL_OUTBOX_BACKOFF_SECONDS']
+    cap = current_app.config['EMAIL_OUTBOX_BACKOFF_MAX_SECONDS']
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), cap))
+
+def _record_failure(email, error):
+    """Schedule a retry with backoff, or give up after EMAIL_OUTBOX_MAX_ATTEMPTS"""
+    email.attempts += 1
+    email.last_error = error
+
+    if email.attempts >= current_app.config['EMAIL_OUTBOX_MAX_ATTEMPTS']:
+        email.status = JobStatus.FAILED
+        logger.error("Email failed permanently", extra={
+            'email_id': email.id, 'recipient': email.recipient, 'attempts': email.attempts, 'error': error
+        })
+    else:
+        email.status = JobStatus.PENDING
+        email.run_after = datetime.utcnow() + _backoff(email.attempts)
+        logger.warning("Email failed, retrying", extra={
+            'email_id': email.id, 'attempts': email.attempts, 'retry_at': email.run_after.isoformat(), 'error': error
+        })
+
+def deliver_emails(email_ids):
+    """Send a set of claimed emails over one SMTP connection; returns how many were sent"""
+    emails = OutboxEmail.query.filter(
+        OutboxEmail.id.in_(email_ids),
+        OutboxEmail.status == JobStatus.RUNNING
+    ).order_by(OutboxEmail.id).all()
+    if not emails:
+        return 0
+
+    sent = 0
+    remaining = list(emails)
+    try:
+        with mail.connect() as connection:
+            while remaining:
+                email = remaining[0]
+                message = Message(
+                    email.subject,
+                    recipients=[email.recipient],
+                    html=email.html_body,
+                    sender=current_app.config['MAIL_DEFAULT_SENDER']
+                )
+                try:
+                    connection.send(message)
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, smtplib.SMTPSenderRefused) as e:
+                    # Only this message was rejected; the connection is still usable
+                    _record_failure(email, str(e))
+                else:
+                    db.session.delete(email)
+                    sent += 1
+                remaining.pop(0)
+    except Exception as e:
+        # Connecting failed or the connection dropped: retry everything not yet sent
+        for email in remaining:
+            _record_failure(email, f"SMTP connection error: {e}")
+
+    db.session.commit()
+    return sent
+
+def run_delivery_loop(app, stop_event, batch_size, poll_seconds):
+    """Claim and deliver emails until stop_event is set"""
+    while not stop_event.is_set():
+        with app.app_context():
+            try:
+                email_ids = claim_emails(batch_size)
+                if email_ids:
+                    sent = deliver_emails(email_ids)
+                    logger.info("Delivered emails", extra={'sent_count': sent, 'claimed_count': len(email_ids)})
+            except Exception as e:
+                db.session.rollback()
+                logger.exception("Email delivery worker error", extra={'error': str(e)})
+                email_ids = []
+            finally:
+                db.session.remove()
+
+        if not email_ids:
+            stop_event.wait(poll_seconds)
+
+@click.command('run-email-worker')
+@click.option('--once', is_flag=True, help='Deliver what is due now and exit.')
+@with_appcontext
+def run_email_worker_command(once):
+    """Run the worker that sends queued emails from the outbox."""
+    app = current_app._get_current_object()
+    app.logger.setLevel(logging.INFO)
+    batch_size = app.config['EMAIL_OUTBOX_BATCH_SIZE']
+
+    if once:
+        total = 0
+        while True:
+            email_ids = claim_emails(batch_size)
+            if not email_ids:
+                break
+            total += deliver_emails(email_ids)
+        push_metrics(app, 'run-email-worker')
+        click.echo(f"Delivered {total} emails")
+        return
+
+    start_metrics_server(app, app.config['EMAIL_OUTBOX_METRICS_PORT'])
+    stop_event = threading.Event()
+    click.echo("Email delivery worker started")
+    try:
+        run_delivery_loop(app, stop_event, batch_size, app.config['EMAIL_OUTBOX_POLL_SECONDS'])
+    except KeyboardInterrupt:
+        stop_event.set()
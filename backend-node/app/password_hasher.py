@@ -0,0 +1,88 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+import bcrypt as bcrypt_lib
+
+from .config import Config
+
+class PasswordHasherBusyError(Exception):
+    """Raised when too many hashes are already queued; the caller should retry later"""
+
+def _hash_password(password, rounds):
+    return bcrypt_lib.hashpw(password.encode('utf-8'), bcrypt_lib.gensalt(rounds=rounds)).decode('utf-8')
+
+def _check_password(password_hash, password):
+    try:
+        return bcrypt_lib.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    except ValueError:
+        return False  # Malformed stored hash
+
+def hash_rounds(password_hash):
+    """Work factor a bcrypt hash was made with ($2b$12$... -> 12), or None if unparseable"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded process pool so hashing doesn't hold this worker's GIL.
+    
+    At most ``max_workers + max_queue`` hashes are in flight; beyond that
+    PasswordHasherBusyError is raised straight away instead of letting a login
+    storm pile up. A hash whose caller timed out keeps its slot until it has
+    actually finished in the pool. ``max_workers=0`` hashes inline.
+    """
+    
+    def __init__(self, rounds, max_workers, max_queue, timeout_seconds):
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.timeout_seconds = timeout_seconds
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+    
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # Created on first use so it belongs to the serving process, and spawned rather
+                # than forked because the web worker is multi-threaded by then
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._pool
+    
+    def _run(self, fn, *args):
+        if self.max_workers <= 0:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusyError("Too many password hashes in progress")
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout_seconds)
+        except FutureTimeoutError:
+            future.cancel()  # Only possible while still queued; a running hash holds its slot until done
+            raise PasswordHasherBusyError("Password hashing timed out")
+    
+    def hash(self, password):
+        return self._run(_hash_password, password, self.rounds)
+    
+    def check(self, password_hash, password):
+        return self._run(_check_password, password_hash, password)
+    
+    def needs_rehash(self, password_hash):
+        rounds = hash_rounds(password_hash)
+        return rounds is None or rounds < self.rounds
+
+password_hasher = PasswordHasher(
+    rounds=Config.BCRYPT_LOG_ROUNDS,
+    max_workers=Config.PASSWORD_HASH_WORKERS,
+    max_queue=Config.PASSWORD_HASH_MAX_QUEUE,
+    timeout_seconds=Config.PASSWORD_HASH_TIMEOUT_SECONDS
+)
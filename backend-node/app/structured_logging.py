@@ -0,0 +1,153 @@
+"""JSON logging through a background writer thread.
+
+Everything under the ``app`` logger (Flask's app.logger and every module's
+logging.getLogger(__name__)) is put on a bounded in-memory queue and written to
+stdout by a QueueListener thread, so request threads never block on I/O. When
+the queue is full records are dropped and counted rather than waited on.
+
+Levels can be set per logger (LOG_LEVELS) and chatty loggers can be sampled
+(LOG_SAMPLE_RATES); sampling only ever drops records below WARNING.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+ROOT_LOGGER = 'app'
+
+# Attributes every LogRecord has; anything else was passed through extra= and is emitted as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'taskName'}
+
+def parse_logger_settings(value):
+    """'app.notes=INFO,app.ai_service.calls=0.1' -> {'app.notes': 'INFO', 'app.ai_service.calls': '0.1'}"""
+    settings = {}
+    for item in (value or '').split(','):
+        name, sep, setting = item.partition('=')
+        if sep and name.strip() and setting.strip():
+            settings[name.strip()] = setting.strip()
+    return settings
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message, any extra fields and the traceback"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of the records below WARNING from the configured loggers and their children"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates  # logger name -> fraction kept
+
+    def _rate(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0:
+            return True
+        if random.random() >= rate:
+            return False
+        record.sample_rate = rate  # Lets a reader scale counts back up
+        return True
+
+class BackgroundQueueHandler(QueueHandler):
+    """Non-blocking QueueHandler whose listener thread is started lazily in each process.
+
+    Starting on first use (and again after a fork) keeps gunicorn --preload
+    working: threads don't survive fork, so each worker starts its own writer.
+    """
+
+    def __init__(self, handlers, max_size):
+        super().__init__(queue.Queue(max_size))
+        self.handlers = handlers
+        self.max_size = max_size
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.stop)
+
+    def _start(self):
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # A queue inherited through fork may hold a lock taken by a thread that no longer exists
+            self.queue = queue.Queue(self.max_size)
+            self._listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def stop(self):
+        """Drain the queue and stop the writer; called at exit"""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._pid = None
+
+    def prepare(self, record):
+        # Render the message here: args may be ORM objects that must not be touched from another thread
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def configure_logging(app):
+    """Route the app's loggers through the background JSON writer; safe to call once per create_app"""
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(app.config['LOG_LEVEL'])
+    for name, level in parse_logger_settings(app.config['LOG_LEVELS']).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    rates = {name: float(rate) for name, rate in parse_logger_settings(app.config['LOG_SAMPLE_RATES']).items()}
+    existing = next((h for h in logger.handlers if isinstance(h, BackgroundQueueHandler)), None)
+    if existing is not None:
+        existing.filters[0].rates = rates
+        return existing
+
+    stream = logging.StreamHandler(sys.stdout)
+    if app.config['LOG_FORMAT'] == 'json':
+        stream.setFormatter(JSONFormatter())
+    else:
+        stream.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+    handler = BackgroundQueueHandler([stream], app.config['LOG_QUEUE_SIZE'])
+    handler.addFilter(SamplingFilter(rates))
+    logger.addHandler(handler)
+    # Flask only adds its own stderr handler when none is configured; don't also print via the root logger
+    logger.propagate = False
+    return handler
@@ -1,47 +1,197 @@
 from . import db
-from .models import Note, NoteStatus
-from .ai_service import gemini_service
+from .models import Note, NoteStatus, NoteStats, GLOBAL_STATS_USER_ID, STATUS_COUNT_COLUMNS
+from .enrichment import enqueue_enrichment
+from .metrics import NOTES_AUTO_ARCHIVED, push_metrics
+from .events import prune_events
 from flask import current_app
+from flask.cli import with_appcontext
+from flask_migrate import stamp, upgrade
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from collections import Counter, defaultdict
+from sqlalchemy import func, inspect
+import click
+import logging
+import os
 
-def archive_expired_notes():
-    """Background task to archive expired notes"""
+# The create_all() schema that predates migrations/versions
+BASELINE_REVISION = '4c1d8e2a9b73'
+
+logger = logging.getLogger(__name__)
+
+def _archive_batch(notes):
+    """Archive each note in the batch and queue AI enrichment for those missing it"""
+    for note in notes:
+        note.archive()
+    
+    enqueue_enrichment(notes)
+
+def _sweep_id_range(cutoff, start_after_id, end_id, batch_size, count_metrics=True):
+    """Archive notes expired at cutoff with start_after_id < id <= end_id, one committed batch at a time"""
+    archived_count = 0
+    last_id = start_after_id
+    
+    while True:
+        query = Note.query.filter(
+            Note.status == NoteStatus.ACTIVE,
+            Note.expires_at <= cutoff,
+            Note.id > last_id
+        )
+        if end_id is not None:
+            query = query.filter(Note.id <= end_id)
+        
+        batch = query.order_by(Note.id).limit(batch_size).all()
+        if not batch:
+            break
+        
+        _archive_batch(batch)
+        last_id = batch[-1].id
+        db.session.commit()
+        db.session.expunge_all()
+        if count_metrics:
+            NOTES_AUTO_ARCHIVED.labels('sweep').inc(len(batch))
+        
+        archived_count += len(batch)
+        logger.info("Archived expired notes batch", extra={'archived_count': len(batch), 'checkpoint_id': last_id})
+    
+    return archived_count
+
+def _sweep_id_range_in_worker(args):
+    """Process pool entry point: each worker builds its own app and engine"""
+    from . import create_app
+    app = create_app()
+    with app.app_context():
+        # Counted by the parent from the return value; this process's registry is never exported
+        return _sweep_id_range(*args, count_metrics=False)
+
+def archive_expired_notes(batch_size=500, start_after_id=0, workers=1):
+    """Background task to archive expired notes.
+    
+    Expired notes are streamed in id order with keyset pagination and each batch
+    commits on its own. Archived rows drop out of the query, so re-running after a
+    crash picks up where the last committed batch stopped; start_after_id skips to
+    a logged checkpoint. With workers > 1 the id space is split across a process pool.
+    """
     with current_app.app_context():
-        expired_notes = Note.query.filter_by(status=NoteStatus.ACTIVE).all()
-        
-        archived_count = 0
-        for note in expired_notes:
-            if note.is_expired:
-                # Generate AI content before archiving
-                if not note.ai_summary or not note.ai_questions:
-                    try:
-                        ai_result = gemini_service.generate_summary_and_questions(
-                            note.title, note.content
-                        )
-                        note.ai_summary = ai_result['summary']
-                        note.ai_questions = ai_result['questions']
-                    except Exception as e:
-                        current_app.logger.error(f"AI generation failed for note {note.id}: {e}")
-                
-                note.archive()
-                archived_count += 1
+        cutoff = datetime.utcnow()
+        
+        if workers <= 1:
+            archived_count = _sweep_id_range(cutoff, start_after_id, None, batch_size)
+        else:
+            min_id, max_id = db.session.query(func.min(Note.id), func.max(Note.id)).filter(
+                Note.status == NoteStatus.ACTIVE,
+                Note.expires_at <= cutoff,
+                Note.id > start_after_id
+            ).one()
+            db.session.remove()
+            
+            if min_id is None:
+                return 0
+            
+            # Split (min_id - 1, max_id] into one contiguous id range per worker
+            span = max_id - min_id + 1
+            step = -(-span // workers)
+            ranges = [
+                (cutoff, lower, min(lower + step, max_id), batch_size)
+                for lower in range(min_id - 1, max_id, step)
+            ]
+            
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                archived_count = sum(pool.map(_sweep_id_range_in_worker, ranges))
+            NOTES_AUTO_ARCHIVED.labels('sweep').inc(archived_count)
         
         if archived_count > 0:
-            db.session.commit()
-            current_app.logger.info(f"Archived {archived_count} expired notes")
+            logger.info("Archive sweep finished", extra={'archived_count': archived_count, 'workers': workers})
         
         return archived_count
 
 def get_stats_for_all_users():
     """Get global statistics for admin purposes"""
     with current_app.app_context():
-        active_count = Note.query.filter_by(status=NoteStatus.ACTIVE).count()
-        archived_count = Note.query.filter_by(status=NoteStatus.ARCHIVED).count()
-        revived_count = Note.query.filter_by(status=NoteStatus.REVIVED).count()
-        
-        return {
-            'active_notes': active_count,
-            'archived_notes': archived_count,
-            'revived_notes': revived_count,
-            'total_notes': active_count + archived_count + revived_count
-        }
+        stats = db.session.get(NoteStats, GLOBAL_STATS_USER_ID) or NoteStats(user_id=GLOBAL_STATS_USER_ID)
+        return stats.to_dict()
+
+def reconcile_note_stats():
+    """Rebuild every note_stats row from a GROUP BY over the notes table.
+    
+    The counters are maintained incrementally, so this only has to fix drift
+    (bulk SQL edits, rows written before the counters existed). Run it off-peak.
+    """
+    with current_app.app_context():
+        counts = defaultdict(Counter)
+        rows = db.session.query(Note.user_id, Note.status, func.count(Note.id)).group_by(
+            Note.user_id, Note.status
+        ).all()
+        for user_id, status, count in rows:
+            column = STATUS_COUNT_COLUMNS[status]
+            counts[user_id][column] += count
+            counts[GLOBAL_STATS_USER_ID][column] += count
+        
+        corrected = 0
+        for stats in NoteStats.query.all():
+            expected = counts.pop(stats.user_id, Counter())
+            for column in STATUS_COUNT_COLUMNS.values():
+                if getattr(stats, column) != expected[column]:
+                    setattr(stats, column, expected[column])
+                    corrected += 1
+        
+        for user_id, expected in counts.items():
+            db.session.add(NoteStats(user_id=user_id, **{
+                column: expected[column] for column in STATUS_COUNT_COLUMNS.values()
+            }))
+            corrected += 1
+        
+        db.session.commit()
+        logger.info("Reconciled note stats", extra={'corrected_count': corrected})
+        return corrected
+
+@click.command('archive-expired')
+@click.option('--batch-size', type=int, default=None, help='Notes archived per committed batch.')
+@click.option('--start-after-id', type=int, default=0, help='Resume after this note id.')
+@click.option('--workers', type=int, default=1, help='Split the id space across this many processes.')
+@with_appcontext
+def archive_expired_command(batch_size, start_after_id, workers):
+    """Sweep the whole notes table and archive every expired note."""
+    try:
+        archived_count = archive_expired_notes(
+            batch_size=batch_size or current_app.config['ARCHIVE_SWEEP_BATCH_SIZE'],
+            start_after_id=start_after_id,
+            workers=workers
+        )
+    finally:
+        # Pushed even after a failure, so the batches that did commit are counted
+        push_metrics(current_app._get_current_object(), 'archive-expired')
+    click.echo(f"Archived {archived_count} expired notes")
+
+@click.command('reconcile-stats')
+@with_appcontext
+def reconcile_stats_command():
+    """Recount notes by user and status and fix any drift in note_stats."""
+    corrected = reconcile_note_stats()
+    click.echo(f"Corrected {corrected} note stat counters")
+
+@click.command('prune-events')
+@with_appcontext
+def prune_events_command():
+    """Delete note events older than EVENTS_RETENTION_SECONDS (the archiver also does this)."""
+    pruned = prune_events(current_app.config['EVENTS_RETENTION_SECONDS'])
+    click.echo(f"Pruned {pruned} note events")
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Migrate the schema to the latest revision (run once per deploy, not on every worker boot)."""
+    directory = os.path.join(os.path.dirname(current_app.root_path), 'migrations')
+    inspector = inspect(db.engine)
+    
+    # Databases built by create_all() before migrations existed have tables but no alembic_version
+    if not inspector.has_table('alembic_version') and inspector.has_table('note'):
+        if 'expires_at' in {column['name'] for column in inspector.get_columns('note')}:
+            revision = 'head'  # Already built from the current models
+        else:
+            revision = BASELINE_REVISION
+        stamp(directory=directory, revision=revision)
+        click.echo(f"Stamped existing schema as {revision}")
+    
+    upgrade(directory=directory)
+    click.echo("Database schema is up to date")
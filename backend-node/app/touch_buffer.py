@@ -0,0 +1,176 @@
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm.attributes import set_committed_value
+
+from . import db
+from .models import Note, NoteStatus, bump_notes_versions
+
+logger = logging.getLogger(__name__)
+
+class TouchBuffer:
+    """Coalesces touch-on-read into periodic batched UPDATEs.
+    
+    Reads record the latest touch time per note in memory; a background thread
+    (or the size threshold) writes them all with one executemany UPDATE. Notes
+    loaded in this process see their buffered last_revised/expires_at, and
+    touches close to expiry are written through at once, so the archiver in
+    another process never races a pending touch. The latest buffered touch
+    per user goes into that user's ETag until the flush bumps notes_version.
+    """
+    
+    def __init__(self):
+        self._pending = {}  # note_id -> (user_id, touched_at)
+        self._user_touches = {}  # user_id -> latest touched_at among their pending notes
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self._app = None
+    
+    def pending_touch(self, note_id):
+        with self._lock:
+            entry = self._pending.get(note_id)
+        return entry[1] if entry else None
+    
+    def pending_user_touch(self, user_id):
+        with self._lock:
+            return self._user_touches.get(user_id)
+    
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+    
+    def touch(self, app, note):
+        """Touch a loaded note, buffering the write when it is safe to"""
+        now = datetime.utcnow()
+        interval = app.config['TOUCH_BUFFER_FLUSH_SECONDS']
+        if interval <= 0 or note.expires_at - now <= timedelta(seconds=app.config['TOUCH_BUFFER_WRITE_THROUGH_SECONDS']):
+            note.touch()
+            db.session.commit()
+            return
+        
+        with self._lock:
+            self._pending[note.id] = (int(note.user_id), now)
+            self._user_touches[int(note.user_id)] = now
+            pending = len(self._pending)
+            if self._flusher is None:
+                # Started lazily so it only ever runs in the worker process, after any fork
+                self._app = app
+                self._flusher = threading.Thread(target=self._run_flusher, name='touch-buffer-flush', daemon=True)
+                self._flusher.start()
+                atexit.register(self._flush_at_exit)
+        
+        # Reflect the touch on this instance without marking it dirty
+        set_committed_value(note, 'last_revised', now)
+        set_committed_value(note, 'expires_at', now + timedelta(minutes=note.decay_minutes))
+        
+        if pending >= app.config['TOUCH_BUFFER_MAX_PENDING']:
+            try:
+                self.flush()
+            except Exception as e:
+                # The touches were put back for the flusher thread; the read itself succeeded
+                logger.warning("Touch buffer flush failed", extra={'pending_count': self.pending_count(), 'error': str(e)})
+    
+    def flush(self):
+        """Write every buffered touch in one batched UPDATE; returns how many were sent.
+        
+        Runs in a session of its own, so flushing from a request neither
+        commits nor rolls back the request's own work.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                user_touches, self._user_touches = self._user_touches, {}
+            if not pending:
+                return 0
+            
+            session = db.session.session_factory()
+            table = Note.__table__
+            params = [
+                {'touched_note_id': note_id, 'touched_at': touched_at}
+                for note_id, (_, touched_at) in pending.items()
+            ]
+            try:
+                # Bulk Core UPDATE: the flush hooks don't run, so notes_version is bumped here.
+                # The last_revised guard keeps a newer ORM touch (or an archive) from being undone.
+                session.execute(
+                    db.update(table)
+                    .where(
+                        table.c.id == db.bindparam('touched_note_id'),
+                        table.c.status == NoteStatus.ACTIVE,
+                        table.c.last_revised < db.bindparam('touched_at')
+                    )
+                    .values(
+                        last_revised=db.bindparam('touched_at'),
+                        expires_at=expiry_expression(session, db.bindparam('touched_at', type_=db.DateTime))
+                    ),
+                    params
+                )
+                bump_notes_versions(session, {user_id for user_id, _ in pending.values()})
+                session.commit()
+            except Exception:
+                session.rollback()
+                # Put them back unless a newer touch arrived meanwhile
+                with self._lock:
+                    for note_id, entry in pending.items():
+                        if note_id not in self._pending or self._pending[note_id][1] < entry[1]:
+                            self._pending[note_id] = entry
+                    for user_id, touched_at in user_touches.items():
+                        if user_id not in self._user_touches or self._user_touches[user_id] < touched_at:
+                            self._user_touches[user_id] = touched_at
+                raise
+            finally:
+                session.close()
+            return len(pending)
+    
+    def _run_flusher(self):
+        app = self._app
+        while True:
+            time.sleep(app.config['TOUCH_BUFFER_FLUSH_SECONDS'])
+            with app.app_context():
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error("Touch buffer flush failed", extra={'pending_count': self.pending_count(), 'error': str(e)})
+    
+    def _flush_at_exit(self):
+        with self._app.app_context():
+            self.flush()
+
+# touched_at + the row's own decay_minutes, per dialect, so a decay change that raced the touch is respected
+_EXPIRY_EXPRESSIONS = {
+    'postgresql': lambda touched_at, decay: touched_at + func.make_interval(0, 0, 0, 0, 0, decay),
+    'sqlite': lambda touched_at, decay: func.strftime('%Y-%m-%d %H:%M:%f', touched_at, '+' + decay.cast(db.String) + ' minutes'),
+    'mysql': lambda touched_at, decay: func.timestampadd(db.text('MINUTE'), decay, touched_at),
+    'mariadb': lambda touched_at, decay: func.timestampadd(db.text('MINUTE'), decay, touched_at)
+}
+
+def expiry_expression(session, touched_at):
+    """SQL for the expiry a buffered touch sets"""
+    dialect = session.get_bind(mapper=Note.__mapper__).dialect.name
+    return _EXPIRY_EXPRESSIONS[dialect](touched_at, Note.__table__.c.decay_minutes)
+
+def init_touch_buffer(app):
+    """Write touches straight through on databases the batched UPDATE has no expiry expression for"""
+    dialect = make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+    if app.config['TOUCH_BUFFER_FLUSH_SECONDS'] > 0 and dialect not in _EXPIRY_EXPRESSIONS:
+        logger.warning("Touch buffering is not supported on this database; writing touches through", extra={'dialect': dialect})
+        app.config['TOUCH_BUFFER_FLUSH_SECONDS'] = 0
+
+touch_buffer = TouchBuffer()
+
+@event.listens_for(Note, 'load')
+@event.listens_for(Note, 'refresh')
+def apply_buffered_touch(note, *args):
+    """Show notes loaded in this process with any touch still waiting in the buffer"""
+    touched_at = touch_buffer.pending_touch(note.id)
+    if touched_at is None or 'last_revised' not in note.__dict__ or note.last_revised >= touched_at:
+        return
+    set_committed_value(note, 'last_revised', touched_at)
+    if 'expires_at' in note.__dict__ and 'decay_minutes' in note.__dict__:
+        set_committed_value(note, 'expires_at', touched_at + timedelta(minutes=note.decay_minutes))
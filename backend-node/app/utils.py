@@ -1,7 +1,5 @@
 from itsdangerous import URLSafeTimedSerializer
 from flask import current_app
-from flask_mail import Message
-from . import mail
 
 def generate_confirmation_token(email):
     """Generates a secure, timed token."""
@@ -20,13 +18,3 @@ def confirm_token(token, expiration=3600):
         return email
     except Exception:
         return False
-
-def send_email(to, subject, html_body):
-    """Helper function to send an email."""
-    msg = Message(
-        subject,
-        recipients=[to],
-        html=html_body,
-        sender=current_app.config['MAIL_DEFAULT_SENDER']
-    )
-    mail.send(msg)
\ No newline at end of file
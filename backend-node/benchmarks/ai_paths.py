@@ -0,0 +1,157 @@
+"""Latency benchmark for the AI-backed note endpoints, run fully offline.
+
+Drives /ai-revision, /answer-question, /revive, /batch-archive and the
+enrichment worker through the Flask test client with FakeGenerativeModel in
+place of Gemini, and reports throughput and p50/p95/p99 per scenario.
+
+    cd backend-node
+    python -m benchmarks.ai_paths --requests 50 --concurrency 4 --latency lognormal:800,0.5
+    python -m benchmarks.ai_paths --error-rate 0.1 --malformed-rate 0.05 --json > run.json
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from .common import Timer, create_user, make_app, print_report, summarize
+from .fake_gemini import FakeGenerativeModel
+
+QUESTIONS = ["What is the key idea?", "Where would you apply it?", "How does it relate to other topics?"]
+
+def _make_notes(app, user_id, count, status='active', with_questions=False, expired=False):
+    from app import db
+    from app.models import Note
+
+    with app.app_context():
+        notes = []
+        for i in range(count):
+            note = Note(
+                title=f'Bench note {time.perf_counter_ns()}-{i}',
+                content=f'Benchmark content {i} ' * 20,
+                user_id=user_id,
+                decay_minutes=1 if expired else 1440,
+                last_revised=datetime.utcnow() - timedelta(minutes=5) if expired else datetime.utcnow()
+            )
+            if with_questions:
+                note.ai_summary = 'Existing summary'
+                note.ai_questions = QUESTIONS
+            if status == 'archived':
+                note.archive()
+            db.session.add(note)
+            notes.append(note)
+        db.session.commit()
+        return [note.id for note in notes]
+
+def _run_requests(app, name, request_fns, concurrency):
+    """Run each request function (taking a test client) and time it"""
+    def timed(fn):
+        client = app.test_client()
+        start = time.perf_counter()
+        response = fn(client)
+        return time.perf_counter() - start, response.status_code >= 500
+
+    with Timer() as timer:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(timed, request_fns))
+
+    return summarize(name, [latency for latency, _ in outcomes], timer.elapsed, sum(failed for _, failed in outcomes))
+
+def bench_ai_revision(app, user_id, headers, args):
+    note_ids = _make_notes(app, user_id, args.requests)
+    fns = [lambda c, i=i: c.post(f'/api/notes/{i}/ai-revision', headers=headers) for i in note_ids]
+    return _run_requests(app, 'ai-revision', fns, args.concurrency)
+
+def bench_answer_question(app, user_id, headers, args):
+    note_ids = _make_notes(app, user_id, args.requests, with_questions=True)
+    fns = [
+        lambda c, i=i: c.post(f'/api/notes/{i}/answer-question', headers=headers,
+                              json={'question_index': 0, 'answer': f'A detailed answer number {i}'})
+        for i in note_ids
+    ]
+    return _run_requests(app, 'answer-question', fns, args.concurrency)
+
+def bench_revive(app, user_id, headers, args):
+    note_ids = _make_notes(app, user_id, args.requests, status='archived', with_questions=True)
+    fns = [
+        lambda c, i=i: c.post(f'/api/notes/{i}/revive', headers=headers,
+                              json={'question_index': 0, 'answer': f'A detailed revival answer {i}'})
+        for i in note_ids
+    ]
+    return _run_requests(app, 'revive', fns, args.concurrency)
+
+def bench_batch_archive(app, user_id, headers, args):
+    # Each request archives its own set of expired notes, so these run one at a time
+    client = app.test_client()
+    latencies, errors = [], 0
+    with Timer() as timer:
+        for _ in range(args.requests):
+            _make_notes(app, user_id, args.notes_per_archive, expired=True)
+            start = time.perf_counter()
+            response = client.post('/api/notes/batch-archive', headers=headers)
+            latencies.append(time.perf_counter() - start)
+            errors += response.status_code >= 500
+    return summarize('batch-archive', latencies, timer.elapsed, errors)
+
+def bench_enrichment(app, user_id, headers, args):
+    """Drain the jobs queued by batch-archive; each claim-and-process round counts as one request"""
+    from app import db
+    from app.enrichment import claim_jobs, process_jobs
+
+    latencies = []
+    with Timer() as timer:
+        while True:
+            with app.app_context():
+                start = time.perf_counter()
+                job_ids = claim_jobs(app.config['ENRICHMENT_CLAIM_BATCH_SIZE'])
+                if not job_ids:
+                    db.session.remove()
+                    break
+                process_jobs(job_ids)
+                latencies.append(time.perf_counter() - start)
+                db.session.remove()
+    return summarize('enrichment-worker', latencies, timer.elapsed)
+
+SCENARIOS = {
+    'ai-revision': bench_ai_revision,
+    'answer-question': bench_answer_question,
+    'revive': bench_revive,
+    'batch-archive': bench_batch_archive,
+    'enrichment-worker': bench_enrichment
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=50, help='Requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent clients')
+    parser.add_argument('--latency', default='lognormal:800,0.5', help='Fake Gemini latency distribution')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--malformed-rate', type=float, default=0.0)
+    parser.add_argument('--notes-per-archive', type=int, default=10, help='Expired notes per batch-archive request')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated subset to run')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    app = make_app()
+    user_id, headers = create_user(app)
+
+    from app.ai_cache import summary_cache, validation_cache
+    from app.ai_executor import ai_executor
+    from app.ai_service import gemini_service
+    fake = FakeGenerativeModel(args.latency, args.error_rate, args.malformed_rate, seed=args.seed)
+    gemini_service.model = fake
+
+    results = []
+    for name in args.scenarios.split(','):
+        summary_cache.memory.clear()
+        validation_cache.memory.clear()
+        ai_executor.breaker.reset()  # Don't let one scenario's failures short-circuit the next
+        calls_before = fake.calls
+        result = SCENARIOS[name](app, user_id, headers, args)
+        result['ai_calls'] = fake.calls - calls_before
+        results.append(result)
+
+    print_report(results, as_json=args.json)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Shared setup and reporting for the offline benchmarks"""
+import json
+import os
+import statistics
+import tempfile
+import time
+
+def make_app():
+    """Build the app against a throwaway SQLite database"""
+    db_path = os.path.join(tempfile.mkdtemp(prefix='bench-'), 'bench.db')
+    os.environ['DATABASE_URI'] = f'sqlite:///{db_path}'
+    os.environ.pop('GEMINI_API_KEY', None)
+
+    from app import create_app, db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    return app
+
+def create_user(app, username='bench'):
+    """Create a verified user and return (user_id, auth headers)"""
+    from flask_jwt_extended import create_access_token
+    from app import db
+    from app.models import User
+
+    with app.app_context():
+        user = User(username=username, email=f'{username}@example.com', is_verified=True)
+        user.set_password('BenchPass123')
+        db.session.add(user)
+        db.session.commit()
+        token = create_access_token(identity=str(user.id))
+        return user.id, {'Authorization': f'Bearer {token}'}
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def summarize(name, latencies, elapsed, errors=0):
+    """Throughput and latency percentiles (ms) for one scenario"""
+    return {
+        'scenario': name,
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0,
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2) if latencies else 0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else 0,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2) if latencies else 0,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else 0
+    }
+
+def print_report(results, as_json=False):
+    if as_json:
+        print(json.dumps(results, indent=2))
+        return
+
+    columns = list(results[0])
+    widths = {column: max(len(column), *(len(str(row[column])) for row in results)) for column in columns}
+    print('  '.join(column.ljust(widths[column]) for column in columns))
+    for row in results:
+        print('  '.join(str(row[column]).ljust(widths[column]) for column in columns))
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
@@ -0,0 +1,97 @@
+"""Offline stand-in for the ``genai.GenerativeModel`` interface used by GeminiService.
+
+Swap it in with ``gemini_service.model = FakeGenerativeModel(...)``. Latency,
+error rate and malformed-response rate are configurable so the AI path can be
+exercised under realistic or pathological conditions without an API key.
+"""
+import json
+import random
+import re
+import threading
+import time
+
+class LatencyDistribution:
+    """Samples call latency in seconds.
+
+    Built from a spec string:
+        fixed:500            always 500 ms
+        uniform:200,1500     uniform between 200 and 1500 ms
+        lognormal:800,0.5    lognormal with an 800 ms median and sigma 0.5
+    """
+
+    def __init__(self, spec="fixed:0"):
+        kind, _, params = spec.partition(':')
+        values = [float(value) for value in params.split(',')] if params else []
+        if kind not in ('fixed', 'uniform', 'lognormal'):
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        self.kind = kind
+        self.values = values
+        self.spec = spec
+
+    def sample(self, rng):
+        if self.kind == 'fixed':
+            ms = self.values[0] if self.values else 0
+        elif self.kind == 'uniform':
+            ms = rng.uniform(self.values[0], self.values[1])
+        else:
+            median, sigma = self.values
+            ms = median * rng.lognormvariate(0, sigma)
+        return ms / 1000
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeGenerativeModel:
+    """Answers the summary, batch and validation prompts GeminiService sends"""
+
+    def __init__(self, latency="fixed:0", error_rate=0.0, malformed_rate=0.0, seed=None):
+        self.latency = latency if isinstance(latency, LatencyDistribution) else LatencyDistribution(latency)
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _draw(self):
+        with self._lock:
+            self.calls += 1
+            return self.latency.sample(self._rng), self._rng.random(), self._rng.random()
+
+    def generate_content(self, prompt, request_options=None, **kwargs):
+        delay, error_roll, malformed_roll = self._draw()
+
+        timeout = (request_options or {}).get('timeout')
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"Fake Gemini call exceeded {timeout}s")
+        time.sleep(delay)
+
+        if error_roll < self.error_rate:
+            raise RuntimeError("Injected fake Gemini error")
+        if malformed_roll < self.malformed_rate:
+            return FakeResponse("Sure! Here is what you asked for: {\"summary\": \"truncated")
+
+        if 'Evaluate if this answer' in prompt:
+            return FakeResponse("VALID")
+
+        note_ids = re.findall(r'Note ID: (\d+)', prompt)
+        if note_ids:
+            return FakeResponse(json.dumps([self._summary(int(note_id)) for note_id in note_ids]))
+
+        title = re.search(r'Note Title: (.*)', prompt)
+        return FakeResponse(json.dumps(self._summary(title.group(1).strip() if title else None)))
+
+    @staticmethod
+    def _summary(note_ref):
+        result = {
+            "summary": f"Fake summary of {note_ref}. Generated offline for benchmarking.",
+            "questions": [
+                f"What is the key idea of {note_ref}?",
+                f"Where would you apply {note_ref}?",
+                f"How does {note_ref} relate to other topics?"
+            ]
+        }
+        if isinstance(note_ref, int):
+            result = {"id": note_ref, **result}
+        return result
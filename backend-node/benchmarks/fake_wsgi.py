@@ -0,0 +1,17 @@
+"""WSGI entry point that serves the real app with FakeGenerativeModel in place of Gemini.
+
+    FAKE_GEMINI_LATENCY=fixed:2000 gunicorn -c gunicorn.conf.py benchmarks.fake_wsgi:app
+"""
+import os
+
+from app import create_app
+from app.ai_service import gemini_service
+
+from .fake_gemini import FakeGenerativeModel
+
+app = create_app()
+gemini_service.model = FakeGenerativeModel(
+    os.getenv('FAKE_GEMINI_LATENCY', 'fixed:2000'),
+    error_rate=float(os.getenv('FAKE_GEMINI_ERROR_RATE', 0)),
+    malformed_rate=float(os.getenv('FAKE_GEMINI_MALFORMED_RATE', 0))
+)
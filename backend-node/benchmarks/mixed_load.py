@@ -0,0 +1,155 @@
+"""Mixed-traffic load test: slow AI requests alongside cheap CRUD reads, per gunicorn profile.
+
+Starts real gunicorn servers (benchmarks.fake_wsgi, so Gemini is simulated
+offline), keeps --ai-clients looping on /answer-question while --crud-clients
+loop on the note list and /stats, and reports latency per traffic class. With
+the sync profile, slow AI calls hold every worker and CRUD latency climbs to
+the AI latency; with gthread it should stay flat.
+
+    cd backend-node
+    python -m benchmarks.mixed_load --duration 15 --ai-latency fixed:2000
+    python -m benchmarks.mixed_load --profiles gthread --threads 32 --ai-clients 40
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from .common import Timer, create_user, make_app, print_report, summarize
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def _prepare_data(app, user_id):
+    """One note with questions for the AI clients, plus a page of notes to list"""
+    from app import db
+    from app.models import Note
+
+    with app.app_context():
+        notes = [Note(title=f'Load note {i}', content=f'Load test content {i} ' * 20, user_id=user_id) for i in range(50)]
+        notes[0].ai_summary = 'Existing summary'
+        notes[0].ai_questions = ["What is the key idea?", "Where would you apply it?", "How does it relate?"]
+        db.session.add_all(notes)
+        db.session.commit()
+        return notes[0].id
+
+def _start_server(profile, port, args):
+    env = dict(os.environ)
+    env.update({
+        'PORT': str(port),
+        'WEB_CONCURRENCY': str(args.workers),
+        'GUNICORN_WORKER_CLASS': profile,
+        'GUNICORN_THREADS': str(args.threads),
+        'FAKE_GEMINI_LATENCY': args.ai_latency,
+        'AI_BREAKER_SLOW_CALL_SECONDS': '600',  # Simulated slowness shouldn't trip the breaker
+        'PASSWORD_HASH_WORKERS': '0'
+    })
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--log-level', 'warning', 'benchmarks.fake_wsgi:app'],
+        cwd=BACKEND_DIR, env=env
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/static/swagger_memory_decay.json')
+            if connection.getresponse().status == 200:
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"gunicorn ({profile}) did not come up on port {port}")
+
+def _client_loop(port, make_request, stop, latencies, errors, timeout):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    counter = 0
+    while not stop.is_set():
+        method, path, body = make_request(counter)
+        counter += 1
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body=body, headers=_client_loop.headers)
+            response = connection.getresponse()
+            response.read()
+            failed = response.status >= 500
+        except OSError:
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+            failed = True
+        elapsed = time.perf_counter() - start
+        if not stop.is_set():
+            latencies.append(elapsed)
+            errors.append(failed)
+
+def run_profile(profile, port, note_id, headers, args):
+    server = _start_server(profile, port, args)
+    _client_loop.headers = {**headers, 'Content-Type': 'application/json'}
+    try:
+        stop = threading.Event()
+        ai_latencies, ai_errors, crud_latencies, crud_errors = [], [], [], []
+        thread_id = threading.get_ident
+
+        def ai_request(i):
+            answer = json.dumps({'question_index': 0, 'answer': f'Answer {thread_id()}-{i} with enough words'})
+            return 'POST', f'/api/notes/{note_id}/answer-question', answer
+
+        def crud_request(i):
+            return ('GET', '/api/notes/?fields=summary&limit=20', None) if i % 2 == 0 else ('GET', '/api/notes/stats', None)
+
+        clients = [
+            threading.Thread(target=_client_loop, args=(port, ai_request, stop, ai_latencies, ai_errors, args.timeout))
+            for _ in range(args.ai_clients)
+        ] + [
+            threading.Thread(target=_client_loop, args=(port, crud_request, stop, crud_latencies, crud_errors, args.timeout))
+            for _ in range(args.crud_clients)
+        ]
+        with Timer() as timer:
+            for client in clients:
+                client.start()
+            time.sleep(args.duration)
+            stop.set()
+            for client in clients:
+                client.join()
+
+        return [
+            {'profile': profile, **summarize('ai', ai_latencies, timer.elapsed, sum(ai_errors))},
+            {'profile': profile, **summarize('crud', crud_latencies, timer.elapsed, sum(crud_errors))}
+        ]
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', default='sync,gthread', help='Comma-separated gunicorn worker classes')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=16, help='Threads per worker for gthread')
+    parser.add_argument('--ai-clients', type=int, default=8)
+    parser.add_argument('--crud-clients', type=int, default=4)
+    parser.add_argument('--ai-latency', default='fixed:2000', help='Fake Gemini latency distribution')
+    parser.add_argument('--duration', type=float, default=15, help='Seconds per profile')
+    parser.add_argument('--timeout', type=float, default=60, help='Client socket timeout')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    app = make_app()
+    user_id, headers = create_user(app)
+    note_id = _prepare_data(app, user_id)
+
+    results = []
+    for profile in args.profiles.split(','):
+        results.extend(run_profile(profile, _free_port(), note_id, headers, args))
+
+    print_report(results, as_json=args.json)
+
+if __name__ == '__main__':
+    main()
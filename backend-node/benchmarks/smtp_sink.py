@@ -0,0 +1,109 @@
+"""Local SMTP stand-in for exercising the email outbox without a real mail server.
+
+Accepts any login, records every message it receives and can be told to
+refuse a fraction of recipients, so retry and backoff can be observed.
+
+    cd backend-node
+    python -m benchmarks.smtp_sink --port 1025 --reject-rate 0.2
+    MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=false flask --app run:app run-email-worker --once
+"""
+import argparse
+import random
+import socketserver
+import threading
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, reject_rate=0.0, seed=None):
+        super().__init__(address, SMTPSinkHandler)
+        self.reject_rate = reject_rate
+        self.messages = []  # (sender, recipients, data)
+        self.connections = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def should_reject(self):
+        with self._lock:
+            return self._rng.random() < self.reject_rate
+
+    def record(self, sender, recipients, data):
+        with self._lock:
+            self.messages.append((sender, recipients, data))
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        with self.server._lock:
+            self.server.connections += 1
+        self.reply('220 smtp-sink ready')
+        sender, recipients = None, []
+
+        for raw in self.rfile:
+            command = raw.decode('utf-8', 'replace').rstrip('\r\n')
+            verb = command.split(' ', 1)[0].upper()
+
+            if verb == 'EHLO':
+                self.wfile.write(b'250-smtp-sink\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n')
+            elif verb == 'HELO':
+                self.reply('250 smtp-sink')
+            elif verb == 'AUTH':
+                if command.upper().startswith('AUTH LOGIN'):
+                    self.reply('334 VXNlcm5hbWU6')
+                    self.rfile.readline()
+                    self.reply('334 UGFzc3dvcmQ6')
+                    self.rfile.readline()
+                self.reply('235 Authentication successful')
+            elif verb == 'MAIL':
+                sender, recipients = command[10:].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                if self.server.should_reject():
+                    self.reply('550 Mailbox unavailable')
+                else:
+                    recipients.append(command[8:].strip())
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                for data_line in self.rfile:
+                    if data_line in (b'.\r\n', b'.\n'):
+                        break
+                    lines.append(data_line)
+                self.server.record(sender, recipients, b''.join(lines))
+                self.reply('250 OK: queued')
+            elif verb in ('RSET', 'NOOP'):
+                sender, recipients = (None, []) if verb == 'RSET' else (sender, recipients)
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+def start_sink(host='localhost', port=0, reject_rate=0.0, seed=None):
+    """Start a sink on a background thread; returns the server (see server.server_address)"""
+    server = SMTPSink((host, port), reject_rate=reject_rate, seed=seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=1025)
+    parser.add_argument('--reject-rate', type=float, default=0.0, help='Fraction of recipients refused with a 550')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    server = SMTPSink((args.host, args.port), reject_rate=args.reject_rate, seed=args.seed)
+    print(f"SMTP sink listening on {args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"Received {len(server.messages)} messages over {server.connections} connections")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Cold-start benchmark: import time, create_app() time and first-request latency.
+
+Each sample runs in a fresh interpreter, the way a new or recycled gunicorn
+worker would start, and reports p50/p95 for each phase.
+
+    cd backend-node
+    python -m benchmarks.startup --runs 10
+    python -m benchmarks.startup --importtime   # also list the slowest imports
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from .common import print_report, summarize
+
+PROBE = r'''
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+created = time.perf_counter()
+response = flask_app.test_client().get('/static/swagger_memory_decay.json')
+assert response.status_code == 200, response.status_code
+served = time.perf_counter()
+print(json.dumps({'import': imported - start, 'create_app': created - imported, 'first_request': served - created}))
+'''
+
+def run_probe(env):
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE], env=env, capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def slowest_imports(env, count):
+    """Cumulative import times from python -X importtime, slowest first"""
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app; app.create_app()'], env=env,
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), module.rstrip()))
+    return sorted(rows, reverse=True)[:count]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='Fresh interpreters to time')
+    parser.add_argument('--importtime', action='store_true', help='Also print the slowest imports')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env['DATABASE_URI'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-'), 'startup.db')}"
+    env['PYTHONDONTWRITEBYTECODE'] = '0'
+
+    samples = [run_probe(env) for _ in range(args.runs)]
+    results = [
+        summarize(phase, [sample[phase] for sample in samples], sum(sample[phase] for sample in samples))
+        for phase in ('import', 'create_app', 'first_request')
+    ]
+    for result in results:
+        del result['throughput_rps']  # Not meaningful for one-shot phases
+    print_report(results, as_json=args.json)
+
+    if args.importtime and not args.json:
+        print()
+        for cumulative, module in slowest_imports(env, 15):
+            print(f"{cumulative / 1000:10.1f} ms  {module}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Gunicorn settings for the web process (gunicorn -c gunicorn.conf.py run:app).
+
+The default profile is gthread: each worker serves GUNICORN_THREADS requests
+at once, so a request waiting on Gemini parks one thread instead of a whole
+worker. AI_MAX_PENDING caps how many of those threads AI calls may hold;
+beyond it the AI endpoints fall back immediately, leaving the remaining
+threads for CRUD traffic. gevent is not offered: the Gemini client talks
+gRPC, which does not cooperate with gevent's monkey patching.
+
+GUNICORN_WORKER_CLASS=sync restores the old one-request-per-worker behaviour.
+
+Server-sent event streams (/api/notes/events) would each hold a thread for as
+long as they are open, so this server answers them with 503 (see
+EVENTS_MAX_STREAMS_PER_WORKER); they are served by the gevent server in
+gunicorn_events.conf.py instead.
+
+Prometheus samples from every worker are shared through PROMETHEUS_MULTIPROC_DIR,
+which is set here (before the app is imported) and emptied on each start. It is
+not meant for the archiver and worker processes, which export on their own ports.
+"""
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 4))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+# Gunicorn silently upgrades sync workers to gthread when threads > 1, so only thread gthread
+threads = int(os.getenv('GUNICORN_THREADS', 16)) if worker_class == 'gthread' else 1
+
+# Build the app once in the master; the app disposes inherited engine pools after fork
+preload_app = True
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))  # Must exceed AI_CALL_TIMEOUT_SECONDS
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers now and then; cheap since boot no longer imports the Gemini SDK
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 500))
+
+# Must be in the environment before prometheus_client is imported by the preloaded app
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), f"prometheus-multiproc-{bind.rsplit(':', 1)[-1]}")
+)
+# Samples left over from a previous run would be added to this one's
+shutil.rmtree(metrics_dir, ignore_errors=True)
+os.makedirs(metrics_dir, exist_ok=True)
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
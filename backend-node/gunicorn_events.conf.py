@@ -0,0 +1,43 @@
+"""Gunicorn settings for the event stream server (gunicorn -c gunicorn_events.conf.py run:app).
+
+Server-sent event streams (/api/notes/events) stay open for up to
+EVENTS_STREAM_MAX_SECONDS and spend nearly all of it waiting. The threaded web
+server would pin a request thread to each, so they are served here instead by
+gevent workers, where an open stream costs a greenlet and a socket. Each worker
+holds up to EVENTS_MAX_STREAMS_PER_WORKER streams (5000 by default) and polls
+note_event once per EVENTS_POLL_SECONDS however many are open.
+
+Route /api/notes/events (and nothing else) to this server at the reverse proxy,
+with response buffering off. gevent is safe here because streams never call
+Gemini, whose gRPC client is why the web server doesn't use it.
+"""
+import os
+import shutil
+import tempfile
+
+# Read by Config before the app is imported, so the stream cap defaults to the gevent value
+os.environ.setdefault('GUNICORN_WORKER_CLASS', 'gevent')
+
+bind = f"0.0.0.0:{os.getenv('EVENTS_PORT', '5001')}"
+workers = int(os.getenv('EVENTS_WEB_CONCURRENCY', 2))
+worker_class = 'gevent'
+worker_connections = int(os.getenv('EVENTS_WORKER_CONNECTIONS', 5100))  # Streams plus some headroom for the token and health requests
+
+# Not preloaded: the app must be imported after gevent has patched threading, queue and time in the worker
+preload_app = False
+
+# Streams send a keep-alive every EVENTS_HEARTBEAT_SECONDS, so workers never look idle to the arbiter
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Its own multiprocess dir, so /metrics here reports this server's workers only
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), f"prometheus-multiproc-{bind.rsplit(':', 1)[-1]}")
+)
+shutil.rmtree(metrics_dir, ignore_errors=True)
+os.makedirs(metrics_dir, exist_ok=True)
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
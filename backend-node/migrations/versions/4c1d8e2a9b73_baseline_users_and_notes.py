@@ -0,0 +1,59 @@
+"""baseline users and notes
+
+The schema as it was before migrations were introduced, when db.create_all()
+built it on boot. Databases created that way are stamped with this revision
+by 'flask init-db' and upgraded from here.
+
+Revision ID: 4c1d8e2a9b73
+Revises:
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c1d8e2a9b73'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=150), nullable=False),
+    sa.Column('email', sa.String(length=150), nullable=False),
+    sa.Column('password_hash', sa.String(length=128), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('is_verified', sa.Boolean(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email'),
+    sa.UniqueConstraint('username')
+    )
+    op.create_table('note',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(length=200), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('decay_minutes', sa.Integer(), nullable=False),
+    sa.Column('original_decay_minutes', sa.Integer(), nullable=False),
+    sa.Column('last_revised', sa.DateTime(), nullable=False),
+    sa.Column('status', sa.Enum('ACTIVE', 'ARCHIVED', 'REVIVED', name='notestatus'), nullable=False),
+    sa.Column('wrong_answers_count', sa.Integer(), nullable=False),
+    sa.Column('penalty_applied', sa.Boolean(), nullable=False),
+    sa.Column('ai_summary', sa.Text(), nullable=True),
+    sa.Column('ai_questions', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=True),
+    sa.Column('revived_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('note')
+    op.drop_table('user')
+    sa.Enum(name='notestatus').drop(op.get_bind(), checkfirst=True)
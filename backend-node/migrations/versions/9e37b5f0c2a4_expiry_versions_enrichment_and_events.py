@@ -0,0 +1,177 @@
+"""note expiry, list versions, enrichment, outbox, events and stats
+
+Adds the columns and indexes create_all() never added to existing tables:
+note.expires_at (backfilled as last_revised + decay_minutes),
+note.enrichment_status (READY where AI content exists), user.notes_version
+and user.notes_updated_at. Creates the background job, cache, event and
+stats tables, and fills note_stats from the current notes.
+
+Revision ID: 9e37b5f0c2a4
+Revises: 4c1d8e2a9b73
+Create Date: 2026-10-18 10:05:00.000000
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '9e37b5f0c2a4'
+down_revision = '4c1d8e2a9b73'
+branch_labels = None
+depends_on = None
+
+ENRICHMENT_STATUSES = ('NONE', 'PENDING', 'READY', 'FAILED')
+JOB_STATUSES = ('PENDING', 'RUNNING', 'FAILED')
+
+# The Postgres types are created once up front; two tables share jobstatus, so the columns mustn't create it again
+enrichment_status = sa.Enum(*ENRICHMENT_STATUSES, name='enrichmentstatus').with_variant(
+    postgresql.ENUM(*ENRICHMENT_STATUSES, name='enrichmentstatus', create_type=False), 'postgresql'
+)
+job_status = sa.Enum(*JOB_STATUSES, name='jobstatus').with_variant(
+    postgresql.ENUM(*JOB_STATUSES, name='jobstatus', create_type=False), 'postgresql'
+)
+
+
+def _expires_at_expression(dialect):
+    """SQL for last_revised + decay_minutes on the two databases the app runs on"""
+    if dialect == 'postgresql':
+        return "last_revised + decay_minutes * interval '1 minute'"
+    return "strftime('%Y-%m-%d %H:%M:%f', last_revised, '+' || decay_minutes || ' minutes')"
+
+
+def upgrade():
+    bind = op.get_bind()
+    postgresql.ENUM(*ENRICHMENT_STATUSES, name='enrichmentstatus').create(bind, checkfirst=True)
+    postgresql.ENUM(*JOB_STATUSES, name='jobstatus').create(bind, checkfirst=True)
+
+    # Added nullable, backfilled, then made NOT NULL (SQLite can't add NOT NULL columns without a constant default)
+    op.add_column('user', sa.Column('notes_version', sa.Integer(), nullable=True))
+    op.add_column('user', sa.Column('notes_updated_at', sa.DateTime(), nullable=True))
+    op.add_column('note', sa.Column('expires_at', sa.DateTime(), nullable=True))
+    op.add_column('note', sa.Column('enrichment_status', enrichment_status, nullable=True))
+
+    op.execute(
+        sa.text('UPDATE "user" SET notes_version = 0, notes_updated_at = :now').bindparams(now=datetime.utcnow())
+    )
+    op.execute(f"UPDATE note SET expires_at = {_expires_at_expression(bind.dialect.name)}")
+    enrichment_backfill = "CASE WHEN ai_summary IS NULL THEN 'NONE' ELSE 'READY' END"
+    if bind.dialect.name == 'postgresql':
+        enrichment_backfill = f"CAST({enrichment_backfill} AS enrichmentstatus)"
+    op.execute(f"UPDATE note SET enrichment_status = {enrichment_backfill}")
+
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.alter_column('notes_version', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('notes_updated_at', existing_type=sa.DateTime(), nullable=False)
+    with op.batch_alter_table('note') as batch_op:
+        batch_op.alter_column('expires_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.alter_column('enrichment_status', existing_type=enrichment_status, nullable=False)
+
+    op.create_index('ix_note_user_status_expires_at', 'note', ['user_id', 'status', 'expires_at'], unique=False)
+    op.create_index('ix_note_status_expires_at', 'note', ['status', 'expires_at'], unique=False)
+    op.create_index('ix_note_user_status_last_revised', 'note', ['user_id', 'status', 'last_revised', 'id'], unique=False)
+    op.create_index('ix_note_user_status_archived_at', 'note', ['user_id', 'status', 'archived_at', 'id'], unique=False)
+
+    op.create_table('enrichment_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('note_id', sa.Integer(), nullable=False),
+    sa.Column('status', job_status, nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('run_after', sa.DateTime(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['note_id'], ['note.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_enrichment_job_note_id', 'enrichment_job', ['note_id'], unique=False)
+    op.create_index('ix_enrichment_job_status_run_after', 'enrichment_job', ['status', 'run_after'], unique=False)
+
+    op.create_table('outbox_email',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('recipient', sa.String(length=120), nullable=False),
+    sa.Column('subject', sa.String(length=255), nullable=False),
+    sa.Column('html_body', sa.Text(), nullable=False),
+    sa.Column('status', job_status, nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('run_after', sa.DateTime(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_outbox_email_status_run_after', 'outbox_email', ['status', 'run_after'], unique=False)
+
+    op.create_table('ai_cache_entry',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index('ix_ai_cache_entry_created_at', 'ai_cache_entry', ['created_at'], unique=False)
+
+    op.create_table('note_event',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('note_id', sa.Integer(), nullable=False),
+    sa.Column('event_type', sa.String(length=32), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_note_event_created_at', 'note_event', ['created_at'], unique=False)
+    op.create_index('ix_note_event_user_id_id', 'note_event', ['user_id', 'id'], unique=False)
+
+    op.create_table('note_stats',
+    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('active_notes', sa.Integer(), nullable=False),
+    sa.Column('archived_notes', sa.Integer(), nullable=False),
+    sa.Column('revived_notes', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # Per-user counters, plus the global row (user_id 0) the admin stats read
+    counts = """
+        SUM(CASE WHEN status = 'ACTIVE' THEN 1 ELSE 0 END),
+        SUM(CASE WHEN status = 'ARCHIVED' THEN 1 ELSE 0 END),
+        SUM(CASE WHEN status = 'REVIVED' THEN 1 ELSE 0 END)
+    """
+    op.execute(
+        "INSERT INTO note_stats (user_id, active_notes, archived_notes, revived_notes) "
+        f"SELECT user_id, {counts} FROM note GROUP BY user_id"
+    )
+    op.execute(
+        "INSERT INTO note_stats (user_id, active_notes, archived_notes, revived_notes) "
+        "SELECT 0, COALESCE(SUM(active_notes), 0), COALESCE(SUM(archived_notes), 0), COALESCE(SUM(revived_notes), 0) "
+        "FROM note_stats"
+    )
+
+
+def downgrade():
+    op.drop_table('note_stats')
+    op.drop_index('ix_note_event_user_id_id', table_name='note_event')
+    op.drop_index('ix_note_event_created_at', table_name='note_event')
+    op.drop_table('note_event')
+    op.drop_index('ix_ai_cache_entry_created_at', table_name='ai_cache_entry')
+    op.drop_table('ai_cache_entry')
+    op.drop_index('ix_outbox_email_status_run_after', table_name='outbox_email')
+    op.drop_table('outbox_email')
+    op.drop_index('ix_enrichment_job_status_run_after', table_name='enrichment_job')
+    op.drop_index('ix_enrichment_job_note_id', table_name='enrichment_job')
+    op.drop_table('enrichment_job')
+
+    op.drop_index('ix_note_user_status_archived_at', table_name='note')
+    op.drop_index('ix_note_user_status_last_revised', table_name='note')
+    op.drop_index('ix_note_status_expires_at', table_name='note')
+    op.drop_index('ix_note_user_status_expires_at', table_name='note')
+    with op.batch_alter_table('note') as batch_op:
+        batch_op.drop_column('enrichment_status')
+        batch_op.drop_column('expires_at')
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('notes_updated_at')
+        batch_op.drop_column('notes_version')
+
+    bind = op.get_bind()
+    postgresql.ENUM(name='jobstatus').drop(bind, checkfirst=True)
+    postgresql.ENUM(name='enrichmentstatus').drop(bind, checkfirst=True)
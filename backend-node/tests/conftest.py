@@ -0,0 +1,66 @@
+"""Shared fixtures: a fresh app on throwaway SQLite files, and an authenticated client.
+
+Run from backend-node with ``python -m pytest``.
+"""
+import os
+
+# Config reads the environment once, when the app package is first imported
+os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')  # Hash inline; no process pool per test
+os.environ.setdefault('LOG_LEVEL', 'CRITICAL')
+os.environ.setdefault('METRICS_ENABLED', 'false')
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app import create_app, db
+from app.config import Config
+from app.models import User
+from app.touch_buffer import touch_buffer
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """Build an app with Config overrides; tables are created on the primary database"""
+    apps = []
+
+    def factory(**overrides):
+        monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'primary.db'}")
+        monkeypatch.setattr(Config, 'TOUCH_BUFFER_FLUSH_SECONDS', 3600)  # Tests flush explicitly
+        for key, value in overrides.items():
+            monkeypatch.setattr(Config, key, value, raising=False)
+        app = create_app()
+        with app.app_context():
+            db.create_all(bind_key=None)  # Only the primary; a replica is the test's to populate
+        apps.append(app)
+        return app
+
+    yield factory
+
+    for app in apps:
+        with app.app_context():
+            # Touches buffered by this test must not leak into the next one's database
+            touch_buffer.flush()
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+@pytest.fixture
+def user(app):
+    with app.app_context():
+        user = User(username='reader', email='reader@example.com', is_verified=True)
+        user.set_password('Password123')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+@pytest.fixture
+def auth_headers(app, user):
+    with app.app_context():
+        return {'Authorization': f'Bearer {create_access_token(identity=str(user))}'}
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,101 @@
+"""Read replica routing: read_replica views read from the replica unless the user wrote recently; writes always hit the primary"""
+from datetime import datetime, timedelta
+
+import pytest
+from flask import g
+
+from app import db
+from app.db_routing import REPLICA_BIND_KEY
+from app.models import Note, User
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    app = make_app(SQLALCHEMY_BINDS={REPLICA_BIND_KEY: f"sqlite:///{tmp_path / 'replica.db'}"})
+    with app.app_context():
+        db.metadata.create_all(db.engines[REPLICA_BIND_KEY])
+    return app
+
+def engines(app):
+    with app.app_context():
+        return db.engines[None], db.engines[REPLICA_BIND_KEY]
+
+def replicate(app, note_title):
+    """Copy the primary's users to the replica and give it a note the primary doesn't have"""
+    primary, replica = engines(app)
+    with primary.connect() as source, replica.begin() as target:
+        users = [dict(row._mapping) for row in source.execute(db.select(User.__table__))]
+        target.execute(db.delete(Note.__table__))
+        target.execute(db.delete(User.__table__))
+        target.execute(db.insert(User.__table__), users)
+        now = datetime.utcnow()
+        target.execute(db.insert(Note.__table__), [{
+            'title': note_title, 'content': 'c', 'user_id': users[0]['id'], 'decay_minutes': 60,
+            'original_decay_minutes': 60, 'last_revised': now, 'expires_at': now + timedelta(minutes=60),
+            'status': 'ACTIVE', 'enrichment_status': 'NONE', 'wrong_answers_count': 0, 'penalty_applied': False
+        }])
+
+def last_wrote(app, user_id, seconds_ago):
+    with app.app_context():
+        db.session.get(User, user_id).notes_updated_at = datetime.utcnow() - timedelta(seconds=seconds_ago)
+        db.session.commit()
+
+def titles(response):
+    assert response.status_code == 200
+    return [note['title'] for note in response.get_json()['notes']]
+
+def test_list_reads_from_replica_when_user_has_not_written_recently(app, client, user, auth_headers):
+    last_wrote(app, user, seconds_ago=3600)
+    replicate(app, 'on replica')
+
+    assert titles(client.get('/api/notes/', headers=auth_headers)) == ['on replica']
+
+def test_recent_writer_reads_own_writes_from_primary(app, client, user, auth_headers):
+    replicate(app, 'on replica')
+
+    created = client.post('/api/notes/', headers=auth_headers, json={'title': 'just written', 'content': 'c'})
+    assert created.status_code == 201
+
+    assert titles(client.get('/api/notes/', headers=auth_headers)) == ['just written']
+
+def test_replica_is_used_again_once_the_window_passes(app, client, user, auth_headers):
+    client.post('/api/notes/', headers=auth_headers, json={'title': 'on primary', 'content': 'c'})
+    replicate(app, 'on replica')
+    last_wrote(app, user, seconds_ago=app.config['READ_YOUR_WRITES_SECONDS'] + 1)
+
+    assert titles(client.get('/api/notes/', headers=auth_headers)) == ['on replica']
+
+def test_writes_and_locking_reads_go_to_primary_while_reading_from_replica(app, user):
+    primary, replica = engines(app)
+    with app.test_request_context():
+        g.use_read_replica = True
+
+        assert db.session.get_bind(clause=db.select(Note)) is replica
+        assert db.session.get_bind(clause=db.select(Note).with_for_update()) is primary
+        assert db.session.get_bind(clause=db.update(Note).values(title='x')) is primary
+
+        now = datetime.utcnow()
+        db.session.add(Note(title='written', content='c', user_id=user, decay_minutes=60, last_revised=now))
+        db.session.commit()
+
+    with primary.connect() as connection:
+        assert connection.execute(db.select(Note.title)).scalars().all() == ['written']
+    with replica.connect() as connection:
+        assert connection.execute(db.select(Note.title)).scalars().all() == []
+
+def test_reads_outside_read_replica_views_use_primary(app, client, user, auth_headers):
+    last_wrote(app, user, seconds_ago=3600)
+    replicate(app, 'on replica')
+    _, replica = engines(app)
+    with replica.connect() as connection:
+        replica_note_id = connection.execute(db.select(Note.id)).scalar()
+
+    # GET /<id> touches the note, so it stays on the primary, which doesn't have the replica's note
+    assert client.get(f'/api/notes/{replica_note_id}', headers=auth_headers).status_code == 404
+
+def test_without_replica_the_flag_is_ignored(make_app):
+    app = make_app()
+    with app.app_context():
+        primary = db.engines[None]
+    with app.test_request_context():
+        g.use_read_replica = True
+        assert db.session.get_bind(clause=db.select(Note)) is primary
@@ -0,0 +1,103 @@
+"""Bulk import: per-row results across batches, the row limit, and enrichment status of imported notes"""
+import json
+
+import pytest
+
+from app import db
+from app.models import EnrichmentJob, EnrichmentStatus, Note
+
+def ndjson(rows):
+    return '\n'.join(row if isinstance(row, str) else json.dumps(row) for row in rows) + '\n'
+
+def post_ndjson(client, headers, rows, **params):
+    return client.post('/api/notes/import', headers=headers, query_string=params,
+                       data=ndjson(rows), content_type='application/x-ndjson')
+
+def note_row(i, **extra):
+    return {'title': f'Note {i}', 'content': f'Content {i}', **extra}
+
+@pytest.fixture
+def app(make_app):
+    return make_app(NOTES_IMPORT_BATCH_SIZE=2, NOTES_IMPORT_MAX_ROWS=5)
+
+def test_mixed_rows_get_a_result_each_across_batches(app, client, auth_headers):
+    rows = [note_row(0), {'title': 'No content'}, note_row(2), 'not an object', note_row(4, decay_minutes=0)]
+
+    response = client.post('/api/notes/import', headers=auth_headers, json=rows)
+
+    assert response.status_code == 207
+    body = response.get_json()
+    assert (body['created'], body['failed']) == (2, 3)
+    assert [result['index'] for result in body['results']] == [0, 1, 2, 3, 4]
+    assert [result['status'] for result in body['results']] == ['created', 'error', 'created', 'error', 'error']
+    assert body['results'][1]['error'] == 'Title and content are required'
+    assert body['results'][3]['error'] == 'Each note must be a JSON object'
+    with app.app_context():
+        titles = {note.id: note.title for note in Note.query.all()}
+    assert titles == {body['results'][0]['id']: 'Note 0', body['results'][2]['id']: 'Note 2'}
+
+def test_imported_notes_count_in_stats_and_version(app, client, auth_headers):
+    etag = client.get('/api/notes/stats', headers=auth_headers).headers['ETag']
+
+    response = post_ndjson(client, auth_headers, [note_row(i) for i in range(3)])
+
+    assert response.status_code == 201
+    stats = client.get('/api/notes/stats', headers={**auth_headers, 'If-None-Match': etag})
+    assert stats.status_code == 200
+    assert stats.get_json()['stats']['active_notes'] == 3
+
+def test_ndjson_reports_unparseable_lines(client, auth_headers):
+    response = post_ndjson(client, auth_headers, [note_row(0), '{"title": ', note_row(2)])
+
+    assert response.status_code == 207
+    assert [result['status'] for result in response.get_json()['results']] == ['created', 'error', 'created']
+    assert response.get_json()['results'][1]['error'] == 'Invalid JSON'
+
+def test_rows_past_the_limit_get_one_truncated_result(app, client, auth_headers):
+    response = post_ndjson(client, auth_headers, [note_row(i) for i in range(9)])
+
+    assert response.status_code == 207
+    body = response.get_json()
+    assert body['created'] == 5
+    assert len(body['results']) == 6
+    assert body['results'][-1]['index'] == 5
+    assert body['results'][-1]['status'] == 'truncated'
+    with app.app_context():
+        assert Note.query.count() == 5
+
+def test_non_array_json_is_rejected(client, auth_headers):
+    response = client.post('/api/notes/import', headers=auth_headers, json={'title': 'x', 'content': 'y'})
+
+    assert response.status_code == 400
+
+def enrichment(app):
+    with app.app_context():
+        statuses = {note.title: note.enrichment_status for note in Note.query.all()}
+        jobs = {job.note.title for job in EnrichmentJob.query.all()}
+    return statuses, jobs
+
+def test_notes_imported_with_ai_content_are_ready(app, client, auth_headers):
+    rows = [
+        note_row(0, ai_summary='Summary', ai_questions=['Why?']),
+        note_row(1, ai_summary='Summary only'),
+        note_row(2)
+    ]
+
+    assert post_ndjson(client, auth_headers, rows, enrich='true').status_code == 201
+
+    statuses, jobs = enrichment(app)
+    assert statuses == {
+        'Note 0': EnrichmentStatus.READY,
+        'Note 1': EnrichmentStatus.PENDING,
+        'Note 2': EnrichmentStatus.PENDING
+    }
+    assert jobs == {'Note 1', 'Note 2'}
+
+def test_enrichment_is_not_queued_unless_asked_for(app, client, auth_headers):
+    rows = [note_row(0, ai_summary='Summary', ai_questions=['Why?']), note_row(1)]
+
+    assert post_ndjson(client, auth_headers, rows).status_code == 201
+
+    statuses, jobs = enrichment(app)
+    assert statuses == {'Note 0': EnrichmentStatus.READY, 'Note 1': EnrichmentStatus.NONE}
+    assert jobs == set()
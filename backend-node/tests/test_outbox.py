@@ -0,0 +1,153 @@
+"""Email outbox: claiming, delivery over one SMTP connection, retry and backoff, against benchmarks/smtp_sink.py"""
+import socket
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import JobStatus, OutboxEmail
+from app.outbox import claim_emails, deliver_emails, queue_email
+from benchmarks.smtp_sink import start_sink
+
+@pytest.fixture
+def sink():
+    server = start_sink(port=0, seed=1)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def mail_app(make_app, sink):
+    return make_app(
+        MAIL_SERVER='localhost',
+        MAIL_PORT=sink.server_address[1],
+        MAIL_USE_TLS=False,
+        EMAIL_OUTBOX_MAX_ATTEMPTS=3
+    )
+
+def queue(count):
+    for i in range(count):
+        queue_email(f'user{i}@example.com', f'Subject {i}', f'<p>Body {i}</p>')
+    db.session.commit()
+
+def closed_port():
+    with socket.socket() as probe:
+        probe.bind(('localhost', 0))
+        return probe.getsockname()[1]
+
+def test_claimed_emails_are_delivered_over_one_connection(mail_app, sink):
+    with mail_app.app_context():
+        queue(3)
+        email_ids = claim_emails(10)
+        assert len(email_ids) == 3
+        assert {email.status for email in OutboxEmail.query.all()} == {JobStatus.RUNNING}
+
+        assert deliver_emails(email_ids) == 3
+
+        assert OutboxEmail.query.count() == 0
+        assert sink.connections == 1
+        assert sorted(recipients[0] for _, recipients, _ in sink.messages) == [
+            '<user0@example.com>', '<user1@example.com>', '<user2@example.com>'
+        ]
+
+def test_claim_respects_limit_and_skips_leased_emails(mail_app):
+    with mail_app.app_context():
+        queue(3)
+        first = claim_emails(2)
+        second = claim_emails(10)
+        assert len(first) == 2
+        assert len(second) == 1
+        assert set(first).isdisjoint(second)
+        assert claim_emails(10) == []
+
+def test_expired_lease_is_reclaimed(mail_app):
+    with mail_app.app_context():
+        queue(1)
+        [email_id] = claim_emails(10)
+        # The worker holding it died; its lease runs out
+        db.session.get(OutboxEmail, email_id).run_after = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+
+        assert claim_emails(10) == [email_id]
+
+def test_rejected_recipient_is_retried_with_backoff(mail_app, sink):
+    sink.reject_rate = 1.0
+    with mail_app.app_context():
+        queue(1)
+        email_ids = claim_emails(10)
+
+        assert deliver_emails(email_ids) == 0
+
+        email = db.session.get(OutboxEmail, email_ids[0])
+        assert email.status == JobStatus.PENDING
+        assert email.attempts == 1
+        assert email.run_after > datetime.utcnow()
+        assert 'Mailbox unavailable' in email.last_error
+        assert claim_emails(10) == []  # Not due again until the backoff passes
+
+def test_email_fails_permanently_after_max_attempts(mail_app, sink):
+    sink.reject_rate = 1.0
+    with mail_app.app_context():
+        queue(1)
+        email = OutboxEmail.query.one()
+        for _ in range(3):
+            email.run_after = datetime.utcnow() - timedelta(seconds=1)
+            db.session.commit()
+            deliver_emails(claim_emails(10))
+
+        email = OutboxEmail.query.one()
+        assert email.status == JobStatus.FAILED
+        assert email.attempts == 3
+        assert claim_emails(10) == []
+
+def test_one_rejection_does_not_hold_back_the_rest(mail_app, sink):
+    with mail_app.app_context():
+        queue(4)
+        email_ids = claim_emails(10)
+        sink.reject_rate = 0.5
+
+        sent = deliver_emails(email_ids)
+
+        remaining = OutboxEmail.query.all()
+        assert sent == len(sink.messages)
+        assert sent + len(remaining) == 4
+        assert all(email.status == JobStatus.PENDING and email.attempts == 1 for email in remaining)
+        assert sink.connections == 1
+
+def test_connection_failure_retries_every_claimed_email(make_app):
+    app = make_app(MAIL_SERVER='localhost', MAIL_PORT=closed_port(), MAIL_USE_TLS=False)
+    with app.app_context():
+        queue(2)
+
+        assert deliver_emails(claim_emails(10)) == 0
+
+        emails = OutboxEmail.query.all()
+        assert [email.status for email in emails] == [JobStatus.PENDING, JobStatus.PENDING]
+        assert all(email.last_error.startswith('SMTP connection error') for email in emails)
+
+def test_concurrent_workers_never_claim_the_same_email(mail_app):
+    with mail_app.app_context():
+        queue(40)
+
+    claimed = []
+    lock = threading.Lock()
+    start = threading.Barrier(8)
+
+    def worker():
+        with mail_app.app_context():
+            start.wait()
+            for _ in range(10):
+                email_ids = claim_emails(5)
+                with lock:
+                    claimed.extend(email_ids)
+            db.session.remove()
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == sorted(set(claimed))
+    assert len(claimed) == 40
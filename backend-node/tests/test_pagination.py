@@ -0,0 +1,92 @@
+"""Keyset pagination of the active and archived note lists, including ties on the sort column"""
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Note, NoteStatus
+from app.notes import decode_cursor, encode_cursor
+
+def add_notes(app, user_id, times, status=NoteStatus.ACTIVE):
+    """One note per entry in times (minutes ago); returns ids newest first, ties broken by id"""
+    sort_key = 'archived_at' if status == NoteStatus.ARCHIVED else 'last_revised'
+    now = datetime.utcnow().replace(microsecond=0)
+    with app.app_context():
+        notes = [
+            Note(title=f'{minutes_ago} min', content='c', user_id=user_id, status=status,
+                 **{sort_key: now - timedelta(minutes=minutes_ago)})
+            for minutes_ago in times
+        ]
+        db.session.add_all(notes)
+        db.session.commit()
+        return [note.id for note in sorted(notes, key=lambda note: (getattr(note, sort_key), note.id), reverse=True)]
+
+def page_through(client, url, key, headers, limit):
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {'limit': limit, **({'cursor': cursor} if cursor else {})}
+        response = client.get(url, headers=headers, query_string=params)
+        assert response.status_code == 200
+        body = response.get_json()
+        assert len(body[key]) <= limit
+        seen.extend(note['id'] for note in body[key])
+        pages += 1
+        cursor = body['next_cursor']
+        if cursor is None:
+            return seen, pages
+
+def test_pages_cover_every_note_once_across_ties(app, client, user, auth_headers):
+    # Three notes share a last_revised; a page boundary falls inside the tie
+    expected = add_notes(app, user, [1, 5, 5, 5, 9, 12, 30])
+
+    seen, pages = page_through(client, '/api/notes/', 'notes', auth_headers, limit=2)
+
+    assert seen == expected
+    assert pages == 4
+
+def test_archived_pages_order_by_archived_at_with_ties(app, client, user, auth_headers):
+    expected = add_notes(app, user, [2, 2, 2, 7, 3], status=NoteStatus.ARCHIVED)
+    add_notes(app, user, [1])  # Active notes stay out of the archived list
+
+    seen, _ = page_through(client, '/api/notes/archived', 'archived_notes', auth_headers, limit=2)
+
+    assert seen == expected
+
+def test_note_created_mid_pagination_does_not_shift_later_pages(app, client, user, auth_headers):
+    expected = add_notes(app, user, [3, 4, 5, 6])
+
+    first = client.get('/api/notes/', headers=auth_headers, query_string={'limit': 2}).get_json()
+    client.post('/api/notes/', headers=auth_headers, json={'title': 'new', 'content': 'c'})
+    rest = client.get('/api/notes/', headers=auth_headers,
+                      query_string={'limit': 2, 'cursor': first['next_cursor']}).get_json()
+
+    assert [note['id'] for note in first['notes'] + rest['notes']] == expected
+    assert rest['next_cursor'] is None
+
+def test_cursor_works_when_fields_leave_out_the_sort_column(app, client, user, auth_headers):
+    expected = add_notes(app, user, [1, 2, 3])
+
+    first = client.get('/api/notes/', headers=auth_headers, query_string={'limit': 2, 'fields': 'title'}).get_json()
+    rest = client.get('/api/notes/', headers=auth_headers,
+                      query_string={'limit': 2, 'fields': 'title', 'cursor': first['next_cursor']}).get_json()
+
+    assert set(first['notes'][0]) == {'id', 'title'}
+    assert [note['id'] for note in first['notes'] + rest['notes']] == expected
+
+def test_invalid_cursor_is_rejected(client, auth_headers):
+    for cursor in ['not-a-cursor', encode_cursor(datetime.utcnow(), 1)[:-4], 'WzEsIDJd']:
+        response = client.get('/api/notes/', headers=auth_headers, query_string={'cursor': cursor})
+        assert response.status_code == 400
+        assert response.get_json() == {'error': 'Invalid cursor'}
+
+def test_cursor_round_trips():
+    stamp = datetime(2024, 5, 1, 12, 30, 15, 250)
+    assert decode_cursor(encode_cursor(stamp, 42)) == (stamp, 42)
+
+def test_limit_is_clamped(app, client, user, auth_headers):
+    add_notes(app, user, [1, 2, 3])
+    app.config['NOTES_PAGE_MAX_LIMIT'] = 2
+
+    big = client.get('/api/notes/', headers=auth_headers, query_string={'limit': 1000}).get_json()
+    small = client.get('/api/notes/', headers=auth_headers, query_string={'limit': 0}).get_json()
+
+    assert len(big['notes']) == 2
+    assert len(small['notes']) == 1
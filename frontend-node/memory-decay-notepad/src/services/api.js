@@ -115,12 +115,26 @@ class ApiService {
   }
 
   // Notes methods
+  // The note lists are paginated; follow next_cursor until every page is loaded
+  async getAllPages(endpoint, key) {
+    const items = [];
+    let cursor = null;
+    do {
+      const url = cursor ? `${endpoint}&cursor=${encodeURIComponent(cursor)}` : endpoint;
+      const page = await this.makeRequest(url, { method: 'GET' });
+      items.push(...(page[key] || []));
+      cursor = page.next_cursor;
+    } while (cursor);
+    return { [key]: items };
+  }
+
+  // Note cards and revision screens show content and AI questions, so ask for the full view
   async getNotes() {
-    return this.makeRequest('/notes/', { method: 'GET' });
+    return this.getAllPages('/notes/?fields=full&limit=500', 'notes');
   }
 
   async getArchivedNotes() {
-    return this.makeRequest('/notes/archived', { method: 'GET' });
+    return this.getAllPages('/notes/archived?fields=full&limit=500', 'archived_notes');
   }
 
   async createNote(noteData) {